@@ -4,6 +4,8 @@
 import sys
 import os
 import subprocess
+import time
+import multiprocessing as mp
 sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
 
 #region JUNOSW
@@ -29,15 +31,21 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for impor
 
 #endregion
 import ROOT as R
-import ctypes
 import numpy as np
+import matplotlib
+matplotlib.use("Agg") #non-interactive backend, the plots are only saved (also in the worker processes)
 import matplotlib.pyplot as plt
 #from lib.analysis.tools import Hist, Graph, Scatter
 from utils.ana_tools import Hist
 #from lib.analysis import hit_time_utils as htu
 from utils import hit_time_utils as htu
+from utils.id_utils import id2copyNo
+from utils import root_utils as ru
+from utils import evt_loader as el
+from utils import cache_utils as cu
+from utils.result_writer import ResultWriter, write_summary
 #from lib.plotting.tools import Plot, ColorIterator
-from utils.plot_tools import Plot, ColorIterator
+from utils.plot_tools import Plot, MultiPlot, ColorIterator
 #from lib.plotting.constants import *
 from utils.plot_constants import *
 
@@ -47,6 +55,10 @@ from utils.plot_constants import *
 
 #Settings
 dir_nm = "Simulation_Muon" #has to be changed correctly!
+plot_dpi = 150 #resolution of rasterized plot elements
+read_chunk_size = 1000 #number of detsim entries read from ROOT at once (only one chunk is held in memory)
+worker_num = int(os.environ.get("ANALYSIS_WORKER_NUM", 1)) #number of parallel processes for the file triples (1 = no pool)
+replot = "--replot" in sys.argv #only replots the saved histograms (no hit data is read)
 TUTORIALROOT = os.environ["TUTORIALROOT"]
 
 #region input and output
@@ -74,9 +86,18 @@ input_dirs = [input_dir_det,input_dir_elec2rec,input_dir_det2rec]
 output_dir_plots = os.path.join(workspace, dir_nm, "plots")
 os.makedirs(output_dir_plots, exist_ok=True)
 
+output_dir_hists = os.path.join(output_dir_plots, "hists") #histogram sidecars of the plots
+os.makedirs(output_dir_hists, exist_ok=True)
+
 output_dir_analysis = os.path.join(workspace, dir_nm, "analysis")
 os.makedirs(output_dir_analysis, exist_ok=True)
 
+cache_dir = os.path.join(workspace, dir_nm, "cache") #extracted hit data, reused as long as the .root files don't change
+EXTRACTION_VERSION = 4 #has to be increased if write_det_hits or write_rec_hits are changed
+
+pmt_typs = ['spmt','lpmt']
+stage_nms = ["detsim", "elec2rec", "det2rec"]
+
 
 input_files_det = sorted([f for f in os.listdir(input_dir_det) if f.endswith(".root") and "user" not in f])
 input_user_files_det = sorted([f for f in os.listdir(input_dir_det) if f.endswith(".root") and "user" in f])
@@ -91,197 +112,238 @@ input_user_files_det2rec = sorted([f for f in os.listdir(input_dir_det2rec) if f
 
 
 #region functions
-def plot_hittimes(hittimes,titel,plot_typ): 
+def new_hist():  #histogram of the aligned hittimes, filled event by event
     x_min, x_max = 0, 1000
     hist = Hist()
-    hist.set_bins(x_max-x_min, x_min, x_max)
-    hist.fill(hittimes)
+    hist.set_bins(x_max-x_min, x_min, x_max) #empty histogram if all events fail
+    return hist
+
+hittime_plot = None #figure reused for all hittime plots of a process
+
+def plot_hittimes(hist,titel,plot_typ,output_filename_plot_base,stage_nm): 
+    ### Save histogram as sidecar (for replotting without the hit data)
+    output_path_hist = os.path.join(output_dir_hists, f"{output_filename_plot_base}_{plot_typ}.hist.npz")
+    hist.save(output_path_hist, titel=titel, plot_typ=plot_typ, stage_nm=stage_nm, plot_base_nm=output_filename_plot_base)
+    draw_hittimes(hist, os.path.join(output_dir_plots, f"{output_filename_plot_base}_{plot_typ}.pdf"))
+    return output_path_hist
+
+def draw_hittimes(hist,output_path_plot): 
+    global hittime_plot
+    x_min, x_max = hist.min, hist.max
     ### Plot histogram in plots 
-    plt = Plot(figsize=(12, 8.11))
-    plt.add(hist, color=MAIN_COLOR)
+    if hittime_plot is None:
+        hittime_plot = Plot(figsize=(12, 8.11))
+    plt = hittime_plot
+    plt.clear()
+    plt.add(hist, color=MAIN_COLOR, histtype="stepfilled")
     plt.set_xlim(max(x_min, 1), x_max)
     plt.set_ylim(0, None)
     plt.set_xscale('log')
     plt.set_xlabel("t [ns]")
     plt.set_ylabel("Counts / ns")
     #plt.set_title(f'{titel}_{parts_out[6]}_{plot_typ}')
-    output_path_plot= os.path.join(output_dir_plots, f"{output_filename_plot_base}_{plot_typ}.pdf")
-    plt.savefig(output_path_plot) #, bbox_inches = "tight"
+    plt.savefig(output_path_plot, dpi=plot_dpi, close=False) #, bbox_inches = "tight"
+
+def get_hist_pths():  #saved histograms (sidecars) of the current input files, stale sidecars of other files are ignored
+    plot_base_nms = [f"{os.path.splitext(f)[0]}_plot_" for f in input_files_det + input_files_elec2rec + input_files_det2rec]
+    hist_fnms = sorted(f for f in os.listdir(output_dir_hists) if f.endswith(".hist.npz") and f.startswith(tuple(plot_base_nms)))
+    return [os.path.join(output_dir_hists, f) for f in hist_fnms]
+
+def load_hists(hist_pths):  #loads saved histograms (sidecars)
+    return [Hist.load(hist_pth) for hist_pth in hist_pths]
+
+def replot_hittimes(hists):  #plots of the saved histograms, no hit data needed
+    for hist in hists:
+        draw_hittimes(hist, os.path.join(output_dir_plots, f"{hist.meta['plot_base_nm']}_{hist.meta['plot_typ']}.pdf"))
+
+def plot_overlays(hists):  #one overlay per stage with all files of the run, one column per pmt_typ
+    for stage_nm in stage_nms:
+        stage_hists = [hist for hist in hists if hist.meta["stage_nm"] == stage_nm]
+        if not stage_hists:
+            continue
+        titels = list(dict.fromkeys(hist.meta["titel"] for hist in stage_hists))
+        mplt = MultiPlot(1, len(pmt_typs), figsize=(12*len(pmt_typs), 8.11))
+        for k, pmt_typ in enumerate(pmt_typs):
+            ax = mplt[k]
+            colors = ColorIterator(CMAP, len(titels))
+            for titel, color in zip(titels, colors):
+                for hist in stage_hists:
+                    if hist.meta["titel"] == titel and hist.meta["plot_typ"].endswith(pmt_typ):
+                        ax.add(hist, color=color, histtype="step", label=titel)
+            ax.set_xlim(1, None)
+            ax.set_ylim(0, None)
+            ax.set_xscale('log')
+            ax.set_xlabel("t [ns]")
+            ax.set_ylabel("Counts / ns")
+            ax.set_title(pmt_typ)
+            if len(titels) <= 10:
+                ax.set_legend()
+        mplt.savefig(os.path.join(output_dir_plots, f"{dir_nm}_{stage_nm}_overlay.pdf"), dpi=plot_dpi)
+
+def write_det_hits(writers, user_file_path):  #writes hittimes, pmt ids and positions of the detsim user file to the hit store, read in bulk chunk by chunk
+    for arrs, offsets in ru.iter_tree(user_file_path, "evt", ["hitTime", "pmtID", "edepX", "edepY", "edepZ"], chunk_size=read_chunk_size):
+        for entry in range(ru.get_entry_num(arrs, offsets)):
+            vals = ru.get_entry(arrs, offsets, entry)
+            #pos = (geninfo["InitX"][0], geninfo["InitY"][0], geninfo["InitZ"][0])
+            writers["det"].append(vals["hitTime"], vals["pmtID"], pos=(vals["edepX"], vals["edepY"], vals["edepZ"]))
+
+def write_rec_hits(writers, file_path, user_file_path):  #writes reconstructed first hittimes, pmt copy numbers, charges and positions (LPMTs and SPMTs) trigger by trigger to the hit store
+    par_nms = ["rec_pos", "rec_first_hit_times", "rec_first_hit_pmt_ids", "rec_first_hit_charges"]
+    unknown_id_num = 0
+    for trig_evt in el.load_evts({"edm": file_path, "usr": user_file_path}, "rec", par_nms):
+        unknown_id_num += np.count_nonzero(trig_evt.rec_first_hit_pmt_ids < 0)
+        writers["rec"].append(
+            trig_evt.rec_first_hit_times, #maybe "rec_hit_times" and not "rec_first_hit_times"
+            trig_evt.rec_first_hit_pmt_ids, #-1 for unknown identifiers, these hits are dropped in get_hits
+            pos=trig_evt.rec_pos,
+            hit_charges=trig_evt.rec_first_hit_charges,
+        )
+    if unknown_id_num:
+        print(f"Warnung: {unknown_id_num} unbekannte PMT-Identifier in {file_path}, diese Hits werden verworfen")
+
+def iter_det_evts(user_file_path):  #yields the detsim events of a file (zero-copy slices of the cached hit store)
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [user_file_path], write_det_hits, ["det"], version=EXTRACTION_VERSION)
+    for entry, evt in enumerate(hit_stores["det"]):
+        yield entry, evt["pos"], {pmt_typ: (evt["hit_times"], evt["hit_pmt_ids"]) for pmt_typ in pmt_typs}
+
+def iter_rec_evts(file_path, user_file_path):  #yields the reconstructed triggers of a file (zero-copy slices of the cached hit store)
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [file_path, user_file_path], write_rec_hits, ["rec"], opt_hit_arr_nms=["hit_charges"], version=EXTRACTION_VERSION)
+    for entry, evt in enumerate(hit_stores["rec"]):
+        yield entry, evt["pos"], {pmt_typ: (evt["hit_times"], evt["hit_pmt_ids"]) for pmt_typ in pmt_typs}
 
 def get_hits(hit_times, hit_pmt_ids, pmt_typ):  #gets the hittimes for a pmt_typ 
     hit_times, hit_pmt_ids = htu.select_pmts(hit_times, hit_pmt_ids, pmt_typ=pmt_typ)
-    mask = ~np.isnan(hit_times) & ~np.isnan(hit_pmt_ids)
+    mask = ~np.isnan(hit_times) & ~np.isnan(hit_pmt_ids) & (hit_pmt_ids >= 0) #no tof for unknown pmt ids (-1 from id2copyNo)
     hit_times = hit_times[mask]
     hit_pmt_ids = hit_pmt_ids[mask]
     return hit_times, hit_pmt_ids
-#endregion
-
-
-#region ID Service Implemantation
-R.gInterpreter.AddIncludePath("$JUNOTOP/junosw/Detector/Identifier")
-R.gSystem.Load("libIdentifier.so")
-R.gInterpreter.Declare("""
-    #include "Identifier/Identifier.h"
-    #include "Identifier/IDService.h"
-    auto getIdServ() {
-        auto idService = IDService::getIdServ();
-        std::streambuf* oldCout = std::cout.rdbuf();
-        std::ostringstream nullStream;
-        std::cout.rdbuf(nullStream.rdbuf());
-        idService->init();
-        std::cout.rdbuf(oldCout);
-        return idService;
-    }
-    auto idService = getIdServ();
-    void Ids2CopyNos(unsigned int* pmtIds, int size, int* copyNos) {
-        for (int i = 0; i < size; ++i) {
-            Identifier id(pmtIds[i]);
-            copyNos[i] = idService->id2CopyNo(id);
-        }
-    }
-""")
-
-def id2copyNo(pmt_ids):
-    pmt_ids = np.array(pmt_ids, dtype=np.uint32)
-    copy_nos = np.zeros(len(pmt_ids), dtype=np.int32)
-    pmt_ids_ptr = pmt_ids.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
-    copy_nos_ptr = copy_nos.ctypes.data_as(ctypes.POINTER(ctypes.c_int32))
-    R.Ids2CopyNos(pmt_ids_ptr, len(pmt_ids), copy_nos_ptr)
-    return copy_nos
-#endregion
 
-#Analysis Loop
-for i, analysis_files in enumerate(zip(input_files_det,input_files_elec2rec,input_files_det2rec), start=1):
+def analyse_evts(evts):  #tof correction and alignment event by event, the hittimes are accumulated in one histogram and one record per pmt_typ
+    hists = {pmt_typ: new_hist() for pmt_typ in pmt_typs}
+    records = {pmt_typ: {"entries": [], "poss": [], "hit_times": [], "hit_pmt_ids": [], "hit_nums": [], "align_shifts": [], "errors": []} for pmt_typ in pmt_typs}
+    evt_num = 0
+    for entry, pos, hits in evts:
+        evt_num += 1
+        for pmt_typ, (hit_times_n, hit_pmt_ids_n) in hits.items():
+            record = records[pmt_typ]
+            try:
+                hit_times_n, hit_pmt_ids_n = get_hits(hit_times_n, hit_pmt_ids_n, pmt_typ)
+                hit_times_n = htu.correct_tof(hit_times_n, hit_pmt_ids_n, pos)
+                hit_times_n, hit_pmt_ids_n = htu.remove_nan(hit_times_n, hit_pmt_ids_n)
+                hit_times_n, align_shift = htu.align(hit_times_n, prominence=20, rtn_align_shift=True)
+            except Exception as e:
+                record["errors"].append(f"{entry=}: {e}")
+                print(f"Fehler {e} bei {pmt_typ} in {entry=}\n")
+                continue
+            hists[pmt_typ].add(hit_times_n)
+            record["entries"].append(entry)
+            record["poss"].append(pos)
+            record["hit_times"].append(hit_times_n.astype(np.float32))
+            record["hit_pmt_ids"].append(hit_pmt_ids_n.astype(np.int32))
+            record["hit_nums"].append(len(hit_times_n))
+            record["align_shifts"].append(align_shift)
+    print(f"{evt_num} events analysed\n")
+    for record in records.values():
+        record["entries"] = np.asarray(record["entries"], dtype=np.int64)
+        record["poss"] = np.asarray(record["poss"], dtype=float).reshape(-1, 3)
+        record["hit_times"] = np.concatenate(record["hit_times"]) if record["hit_nums"] else np.zeros(0, dtype=np.float32)
+        record["hit_pmt_ids"] = np.concatenate(record["hit_pmt_ids"]) if record["hit_nums"] else np.zeros(0, dtype=np.int32)
+        record["hit_offsets"] = np.concatenate([[0], np.cumsum(record.pop("hit_nums"), dtype=np.int64)])
+        record["align_shifts"] = np.asarray(record["align_shifts"], dtype=float)
+        record["errors"] = np.asarray(record["errors"], dtype=str)
+    return hists, records
+
+def write_records(result_writer, record_base_nm, stage_nm, file_path, records, analysis_time):  #one record per file, stage and pmt_typ
+    for pmt_typ, record in records.items():
+        result_writer.write(f"{record_base_nm}/{stage_nm}/{pmt_typ}", file_path=file_path, analysis_time=analysis_time, evt_num=len(record["entries"]), **record)
+
+def init_worker():  #prepares ROOT, the calib helpers and the pmt id table once per process
+    ru._declare_calib_helpers()
+    id2copyNo([])
+
+def analyse_files(analysis_files):  #analysis of one (detsim, elec2rec, det2rec) file triple, returns the records of all stages
     basename = os.path.splitext(analysis_files[0])[0]  # without .root
     parts = basename.split("_")
-    sim_nm = "_".join(parts[:6])
-    print(f"[{i}/{len(input_files_elec2rec)}] doing analysis for {sim_nm}")
-    
     titel = "_".join(parts[:3])  # e.g. e-_1
-    
-    parts[-1] = "analysis"
-    output_filename_analysis = "_".join(parts) + ".txt"
-    output_path_analysis = os.path.join(output_dir_analysis, output_filename_analysis)
-
-    with open(output_path_analysis, "w") as f:
-         f.write(f'Data of {titel}:'+"\n")
-         f.write(f'{TUTORIALROOT=}'+"\n")
-         f.write("\n")
-
-    print(f'{TUTORIALROOT=}')
+    stage_results = []
+    hist_pths = [] #sidecars written for this file triple
 
     #region Analysis in detsim 
     print(f'analysis of {analysis_files[0]}\n')
-    with open(output_path_analysis, "a") as f:
-        f.write(f'analysis of {analysis_files[0]}:\n')
-        f.write(f'->\n')
     user_filename = f"{basename}_user.root"
     user_file_path = os.path.join(input_dirs[0], user_filename)
-    with open(output_path_analysis, "a") as f:
-        f.write(f'{user_file_path=}:\n')
     print(f'{user_file_path=}\n')
-    parts_out = basename.split("_")
-    output_filename_plot_base = "_".join(parts_out) + "_plot"
-
-    user_file = R.TFile(user_file_path)
-    evt = user_file.Get("evt")
-    geninfo = user_file.Get("geninfo")
-    evt.GetEntry(0)
-    geninfo.GetEntry(0)
-    hit_times = np.asarray(evt.hitTime)
-    hit_pmt_ids = np.asarray(evt.pmtID)
-    #pos = (geninfo.InitX[0], geninfo.InitY[0], geninfo.InitZ[0])
-    pos = (evt.edepX, evt.edepY, evt.edepZ)
-    with open(output_path_analysis, "a") as f:
-        f.write(f"{pos=}\n")
-    print(f"{pos=}")
-
-    pmt_typs = ['spmt','lpmt']
-    for pmt_typ in pmt_typs:
+    output_filename_plot_base = basename + "_plot"
+
+    start_time = time.perf_counter()
+    hists, records = analyse_evts(iter_det_evts(user_file_path))
+    stage_results.append((stage_nms[0], user_file_path, records, time.perf_counter() - start_time))
+    for pmt_typ, hist in hists.items():
         try:
-            hit_times_n, hit_pmt_ids_n = get_hits(hit_times,hit_pmt_ids,pmt_typ)
-            hit_times_n = htu.correct_tof(hit_times_n, hit_pmt_ids_n, pos)
-            hit_times_n, hit_pmt_ids_n = htu.remove_nan(hit_times_n, hit_pmt_ids_n)
-            hit_times_n = htu.align(hit_times_n, prominence=20)
-            
-            with open(output_path_analysis, "a") as f:
-                f.write(f"hit_times_{pmt_typ}[:10]:{hit_times_n[:10]}\n")
-                f.write(f"hit_pmt_ids_{pmt_typ}[:10]:{hit_pmt_ids_n[:10]}\n\n")
-            #print(f'{hit_times[:10]=}\n')
-            plot_hittimes(hit_times_n,titel,f"hit_time_{pmt_typ}")
-        except Exception as e:
-            with open(output_path_analysis, "a") as f:
-                f.write(f"Fehler {e} bei {pmt_typ}\n")
-            print(f"Fehler {e} bei {pmt_typ}\n")
-    user_file.Close()
+            hist_pths.append(plot_hittimes(hist,titel,f"hit_time_{pmt_typ}",output_filename_plot_base,stage_nms[0]))
+        except Exception as e: #the results of the other pmt_typs and files are kept
+            print(f"Fehler {e} beim Plotten von {pmt_typ} in {user_file_path}\n")
     #endregion
 
 
     #region Analysis in reconstruction
     for j, rec_typ in enumerate(analysis_files[1:], start=1): #analysis for elec2rec and then for det2rec 
         print(f'analysis of {rec_typ}\n')
-        with open(output_path_analysis, "a") as f:
-            f.write(f'analysis of {rec_typ}:\n')
-            f.write(f'->\n')
-
         file_path = os.path.join(input_dirs[j], rec_typ)
         print(f'{file_path=}\n')
         basenm = os.path.splitext(rec_typ)[0]
         user_filename = f"{basenm}_user.root"
         user_file_path = os.path.join(input_dirs[j], user_filename)
         print(f'{user_file_path=}\n')
-        parts_out = basenm.split("_")
-        output_filename_plot_base = "_".join(parts_out) + "_plot"
-
-        
-        
-        #read date in rec file
-        file = R.TFile(file_path)
-        cdLpmtCalibEvt = file.Get("Event/CdLpmtCalib/CdLpmtCalibEvt")
-        cdSpmtCalibEvt = file.Get("Event/CdSpmtCalib/CdSpmtCalibEvt")
-        cdLpmtCalibEvt.GetEntry(0)
-        cdSpmtCalibEvt.GetEntry(0)
-        cdLpmtHitTimes = [calibPmtChannel.firstHitTime() for calibPmtChannel in cdLpmtCalibEvt.CdLpmtCalibEvt.calibPMTCol()] #maybe .time() and not .firstHitTime
-        cdSpmtHitTimes = [calibPmtChannel.firstHitTime() for calibPmtChannel in cdSpmtCalibEvt.CdSpmtCalibEvt.calibPMTCol()]
-        cdLpmtIds = [calibPmtChannel.pmtId() for calibPmtChannel in cdLpmtCalibEvt.CdLpmtCalibEvt.calibPMTCol()]
-        cdSpmtIds = [calibPmtChannel.pmtId() for calibPmtChannel in cdSpmtCalibEvt.CdSpmtCalibEvt.calibPMTCol()]
-        rec_hit_times_spmt = np.array(cdSpmtHitTimes) 
-        rec_hit_times_lpmt = np.array(cdLpmtHitTimes)
-        hit_pmt_ids_spmt = np.array(id2copyNo(cdSpmtIds))
-        hit_pmt_ids_lpmt = np.array(id2copyNo(cdLpmtIds))
-        file.Close()
-        #read data in user file 
-        user_file = R.TFile(user_file_path)
-        tRec = user_file.Get("TRec")
-        tRec.GetEntry(0)
-        rec_pos = (tRec.recx, tRec.recy, tRec.recz)
-        user_file.Close()
-        with open(output_path_analysis, "a") as f:
-            f.write(f"{rec_pos=}\n")
-            f.write(f'before_tof {rec_hit_times_spmt[:10]=}\n')
-            f.write(f'before_tof {rec_hit_times_lpmt[:10]=}\n')
-        print(f"{rec_pos=}")
-
-
-        #reconstructed hittime 
-        rec_hit_times_spmt = htu.correct_tof(rec_hit_times_spmt, hit_pmt_ids_spmt, rec_pos)
-        rec_hit_times_spmt, rec_hit_pmt_ids = htu.remove_nan(rec_hit_times_spmt, hit_pmt_ids_spmt)
-        rec_hit_times_spmt = htu.align(rec_hit_times_spmt, prominence=20)
-        with open(output_path_analysis, "a") as f:
-            f.write(f'after_tof {rec_hit_times_spmt[:10]=}\n')
-            f.write(f'{rec_hit_pmt_ids[:10]=}\n\n')   
-        print(f'{rec_hit_times_spmt[:10]=}\n')
-        plot_hittimes(rec_hit_times_spmt,titel,"rec_hit_time_spmt")
-
-        rec_hit_times_lpmt = htu.correct_tof(rec_hit_times_lpmt, hit_pmt_ids_lpmt, rec_pos)
-        rec_hit_times_lpmt, rec_hit_pmt_ids = htu.remove_nan(rec_hit_times_lpmt, hit_pmt_ids_lpmt)
-        rec_hit_times_lpmt = htu.align(rec_hit_times_lpmt, prominence=20)
-        with open(output_path_analysis, "a") as f:
-            f.write(f'after_tof {rec_hit_times_lpmt[:10]=}\n')
-            f.write(f'{rec_hit_pmt_ids[:10]=}\n\n')   
-        print(f'{rec_hit_times_lpmt[:10]=}\n')
-        plot_hittimes(rec_hit_times_lpmt,titel,"rec_hit_time_lpmt")
+        output_filename_plot_base = basenm + "_plot"
+
+        #reconstructed hittimes of all triggers (read from the rec and user file or from the cache)
+        start_time = time.perf_counter()
+        hists, records = analyse_evts(iter_rec_evts(file_path, user_file_path))
+        stage_results.append((stage_nms[j], file_path, records, time.perf_counter() - start_time))
+        for pmt_typ, hist in hists.items():
+            try:
+                hist_pths.append(plot_hittimes(hist,titel,f"rec_hit_time_{pmt_typ}",output_filename_plot_base,stage_nms[j]))
+            except Exception as e:
+                print(f"Fehler {e} beim Plotten von {pmt_typ} in {file_path}\n")
     #endregion
-        
+    return basename, stage_results, hist_pths
+#endregion
+
 
-   
\ No newline at end of file
+#Analysis Loop
+if __name__ == "__main__":
+    if replot: #plots from the saved histograms only
+        hist_pths = get_hist_pths()
+        replot_hittimes(load_hists(hist_pths))
+    else:
+        output_path_results = os.path.join(output_dir_analysis, f"{dir_nm}_results.npz") #all results of the run, can be loaded with result_writer.load_results
+        output_path_summary = os.path.join(output_dir_analysis, f"{dir_nm}_summary.txt")
+        print(f'{TUTORIALROOT=}')
+
+        all_analysis_files = list(zip(input_files_det,input_files_elec2rec,input_files_det2rec))
+        if worker_num > 1: #file triples are independent, the results are merged in the order of the files
+            pool = mp.get_context("spawn").Pool(min(worker_num, len(all_analysis_files)) or 1, initializer=init_worker)
+            file_results = pool.imap(analyse_files, all_analysis_files)
+        else:
+            pool = None
+            file_results = map(analyse_files, all_analysis_files)
+
+        hist_pths = [] #only the sidecars of this run go into the overlays
+        try:
+            with ResultWriter(output_path_results) as result_writer:
+                for i, (analysis_files, (basename, stage_results, file_hist_pths)) in enumerate(zip(all_analysis_files, file_results), start=1):
+                    hist_pths += file_hist_pths
+                    sim_nm = "_".join(basename.split("_")[:6])
+                    print(f"[{i}/{len(all_analysis_files)}] analysis done for {sim_nm}")
+                    for stage_nm, file_path, records, analysis_time in stage_results:
+                        write_records(result_writer, basename, stage_nm, file_path, records, analysis_time)
+        finally:
+            if pool is not None: #all results are consumed (or an error occurred), remaining workers are stopped
+                pool.terminate()
+                pool.join()
+
+        write_summary(output_path_results, output_path_summary)
+        print(f"results written to {output_path_results}, summary in {output_path_summary}")
+
+    plot_overlays(load_hists(hist_pths))
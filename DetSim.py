@@ -2,33 +2,16 @@
 # example: You can simulate 3x e- (100 MeV , pos: ["0", "0", "0"]) and 2x e- (10 MeV, pos: ["1", "2", "3"] ) 
 # N = [3,2], particles = "e-",  positions = [["0","0","0"],["1","2","3"]]
 
-import subprocess
 import os
-import random
+import sys
+import json
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
 
-#region JUNOSW
-# Pfad zu deinem Setupscript
-SETUP_SCRIPT = "/storage/gpfs_data/juno/junofs/users/siebert/setupscript.sh"
-
-# Befehl: sourcen und dann alle Umgebungsvariablen ausgeben
-cmd = f"source {SETUP_SCRIPT} && env"
-
-# Subprozess mit Bash starten
-proc = subprocess.Popen(
-    cmd,
-    shell=True,
-    executable="/bin/bash",
-    stdout=subprocess.PIPE
-)
-
-# Alle Variablen aus subprocess in das aktuelle Python-Environment laden
-for line in proc.stdout:
-    key, _, value = line.decode("utf-8").partition("=")
-    os.environ[key] = value.strip()
-
-TUTORIALROOT = os.environ["TUTORIALROOT"]
-print(f'{TUTORIALROOT=}')      
-#endregion
+from utils.stages import detsim_cmd
+from utils.shard_planner import draw_seeds
+from utils.executor import run_cmd, run_tasks
+from utils.env_utils import SETUP_SCRIPT, load_env
 
 #Settings
 dir_nm = "Simulation_Muon" #has to be changed correctly! directory where everything should be saved. Doesen't need to exist
@@ -40,49 +23,87 @@ start_evtid = "0"
 particles = "mu-"
 positions = [["0", "0", "0"],["0", "0", "0"],["0", "0", "0"]]
 momentums = [["1000"],["2000"],["3000"]]
+batch = False #True: one tut_detsim run per group with evtmax = N[j] (the particles of a group are the entries of one file, see detsim_index.json)
+worker_num = None #maximum number of files simulated in parallel (None = limited by the cores and the available memory)
+base_seed = None #the seeds of all runs are drawn from it without repetitions (None = new seeds every time; for large productions see DetSimShards.py)
+
 
+def get_detsim_cmds(tutorialroot, output_dir):  #commands of all files (group j, number i, event ids), the seeds are drawn here
+    if len(N)==len(positions)==len(momentums):
+        print("parameters work together")
+    else:
+        raise ValueError("parameters don't work together. Check if N, positions and momentums have the same length")
+    detsim_cmds = []
+    seeds = iter(draw_seeds(len(N) if batch else sum(N), base_seed))
+    for j in range(len(N)):
+        if batch: #all particles of the group in one run, the event ids continue over the groups
+            seed = next(seeds)
+            first_evtid = int(start_evtid) + sum(N[:j])
+            cmd, output_file, user_output_file = detsim_cmd(tutorialroot, output_dir, particles, 1, momentums[j], positions[j], seed, evtmax=str(N[j]), start_evtid=str(first_evtid))
+            detsim_cmds.append((j, 1, seed, cmd, output_file, user_output_file, list(range(first_evtid, first_evtid + N[j]))))
+            continue
+        for i in range(1, N[j] + 1):
+            seed = next(seeds)
+            cmd, output_file, user_output_file = detsim_cmd(tutorialroot, output_dir, particles, i, momentums[j], positions[j], seed, evtmax=evtmax, start_evtid=start_evtid)
+            evtids = list(range(int(start_evtid), int(start_evtid) + int(evtmax)))
+            detsim_cmds.append((j, i, seed, cmd, output_file, user_output_file, evtids))
+    return detsim_cmds
 
-TUTORIALROOT = os.environ["TUTORIALROOT"]
-print(f'{TUTORIALROOT=}')
-workspace = os.environ.get("WORKSPACE")
+def write_detsim_index(detsim_cmds, output_dir):  #index of all particles: file and entry of each particle (group j, number i), only for successfully simulated files
+    index = []
+    for j, i, seed, cmd, output_file, user_output_file, evtids in detsim_cmds:
+        for entry, evtid in enumerate(evtids):
+            index.append({
+                "group": j, "particle": i + entry if batch else i, "particles": particles, "momentum": momentums[j], "position": positions[j],
+                "file": os.path.basename(output_file), "user_file": os.path.basename(user_output_file), "entry": entry, "evtid": evtid, "seed": seed,
+            })
+    index_path = os.path.join(output_dir, "detsim_index.json")
+    tmp_path = f"{index_path}.tmp{os.getpid()}"
+    old_index = []
+    if os.path.isfile(index_path): #files of earlier runs stay in the index, entries of rerun files are replaced
+        file_nms = {entry["file"] for entry in index}
+        with open(index_path, "r") as f:
+            old_index = [entry for entry in json.load(f) if entry["file"] not in file_nms]
+    with open(tmp_path, "w") as f:
+        json.dump(old_index + index, f, indent=1)
+    os.replace(tmp_path, index_path)
 
-os.makedirs(os.path.join(workspace, dir_nm), exist_ok=True) 
-if workspace is None:
-    raise RuntimeError("environment variable WORKSPACE is not set!")
-output_dir = os.path.join(workspace, dir_nm, "detsim")  #declacre the output directory
-os.makedirs(output_dir, exist_ok=True)
 
-if len(N)==len(positions)==len(momentums):
-    print("parameters work together")
-else:
-    raise ValueError("parameters don't work together. Check if N, positions and momentums have the same length")
+if __name__ == "__main__":
+    #region JUNOSW
+    # environment after sourcing the setup script (cached snapshot, see utils/env_utils.py)
+    load_env(SETUP_SCRIPT)
+    #endregion
 
-#Simulation  
-for j in range(len(N)):
-    print(f"Group [{j+1}/{len(N)}]  with {momentums[j][0]}MeV and positions {positions[j]} is Running")
-    for i in range(1, N[j] + 1):
-        seed = random.randint(0, 32767)
-        suffix = f"{particles}_{i}"
-        
-        output_file = os.path.join(output_dir, f"{suffix}_{momentums[j][0]}MeV_{evtmax}Evts_0to0R_{seed}seed_det.root")
-        user_output_file = os.path.join(output_dir, f"{suffix}_{momentums[j][0]}MeV_{evtmax}Evts_0to0R_{seed}seed_det_user.root")
+    TUTORIALROOT = os.environ["TUTORIALROOT"]
+    print(f'{TUTORIALROOT=}')
+    workspace = os.environ.get("WORKSPACE")
 
-        cmd = [
-            "python", f"{TUTORIALROOT}/share/tut_detsim.py",
-            "--evtmax", evtmax,
-            "--anamgr-normal-hit",
-            "--start-evtid", start_evtid,
-            "--seed", str(seed),
-            "--output", output_file,
-            "--user-output", user_output_file,
-            "--anamgr-edm",
-            "gun",
-            "--particles", particles,
-            "--positions", *positions[j],
-            "--momentums", *momentums[j],
-            
-        ]
+    if workspace is None:
+        raise RuntimeError("environment variable WORKSPACE is not set!")
+    os.makedirs(os.path.join(workspace, dir_nm), exist_ok=True) 
+    output_dir = os.path.join(workspace, dir_nm, "detsim")  #declacre the output directory
+    os.makedirs(output_dir, exist_ok=True)
+    log_dir = os.path.join(workspace, dir_nm, "logs", "detsim") #output of the single runs
 
-        print(f"[{i}/{N[j]}] Running with seed={seed}")
-        subprocess.run(cmd)
+    #Simulation  
+    tasks = []
+    detsim_cmds = get_detsim_cmds(TUTORIALROOT, output_dir)
+    for j, i, seed, cmd, output_file, user_output_file, evtids in detsim_cmds:
+        if i == 1:
+            print(f"Group [{j+1}/{len(N)}]  with {momentums[j][0]}MeV and positions {positions[j]} is Running")
+        if batch:
+            print(f"[{N[j]} particles] Running with seed={seed}")
+        else:
+            print(f"[{i}/{N[j]}] Running with seed={seed}")
+        log_path = os.path.join(log_dir, f"{os.path.splitext(os.path.basename(output_file))[0]}.log")
+        tasks.append((os.path.basename(output_file), partial(run_cmd, cmd, log_path)))
 
+    error_count = 0
+    errors = run_tasks(tasks, worker_num=worker_num)
+    for output_filename, e in errors.items():
+        if e is not None:
+            error_count += 1
+            print(f"[ERROR] detsim failed for {output_filename}: {e}")
+    write_detsim_index([detsim_cmd for detsim_cmd in detsim_cmds if errors[os.path.basename(detsim_cmd[4])] is None], output_dir)
+    print(f"Done. Total errors: {error_count}")
@@ -0,0 +1,82 @@
+#This script does large detector simulation productions from a manifest (see utils/shard_planner.py)
+# every configuration of the particles/positions/momentums grid gets evt_num events, split into jobs of evts_per_job events
+# python DetSimShards.py            -> plans the manifest (if it doesn't exist) and runs all jobs (locally or on HTCondor)
+# python DetSimShards.py --job 17   -> runs job 17 of the manifest (used by the HTCondor jobs)
+# python DetSimShards.py --replan   -> plans the manifest again after the settings were changed (otherwise the settings have to match the manifest)
+
+import os
+import sys
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
+
+from utils.shard_planner import plan_shards, check_manifest, save_manifest, load_manifest, get_job_cmd
+from utils.executor import run_cmd, run_tasks
+from utils.env_utils import SETUP_SCRIPT, load_env
+import utils.job_submission as js
+
+#Settings
+dir_nm = "Simulation_Muon_Production" #has to be changed correctly! directory where everything should be saved. Doesen't need to exist
+evt_num = 10000   #number of events per configuration
+evts_per_job = 100
+particles = ["mu-"]
+positions = [["0", "0", "0"]]
+momentums = [["1000"],["2000"],["3000"]]
+base_seed = 0 #the same base seed always gives the same seeds, change it for a statistically independent production
+start_evtid = 0
+condor = False #True: one HTCondor job per manifest job, False: all jobs locally
+worker_num = None #maximum number of jobs run locally in parallel (None = limited by the cores and the available memory)
+replan = "--replan" in sys.argv
+
+
+def run_job(job, tutorialroot, output_dir, log_dir):
+    cmd, output_file, user_output_file = get_job_cmd(tutorialroot, output_dir, job)
+    log_path = os.path.join(log_dir, f"{os.path.splitext(os.path.basename(output_file))[0]}.log")
+    run_cmd(cmd, log_path)
+
+
+if __name__ == "__main__":
+    workspace = os.environ.get("WORKSPACE")
+    if workspace is None:
+        raise RuntimeError("environment variable WORKSPACE is not set!")
+    output_dir = os.path.join(workspace, dir_nm, "detsim")
+    os.makedirs(output_dir, exist_ok=True)
+    log_dir = os.path.join(workspace, dir_nm, "logs", "detsim")
+    manifest_path = os.path.join(workspace, dir_nm, "detsim_manifest.json")
+
+    #region Job
+    if "--job" in sys.argv:
+        manifest = load_manifest(manifest_path)
+        job = manifest["jobs"][int(sys.argv[sys.argv.index("--job") + 1])]
+        if "TUTORIALROOT" not in os.environ:
+            load_env(SETUP_SCRIPT)
+        print(f"Job {job['job']}: {job['evtmax']} events of {job['particles']} with {job['momentum'][0]}MeV, seed={job['seed']}, start_evtid={job['start_evtid']}")
+        run_job(job, os.environ["TUTORIALROOT"], output_dir, log_dir)
+        sys.exit(0)
+    #endregion
+
+    #region Manifest
+    if os.path.isfile(manifest_path) and not replan: #an existing plan is never redrawn, so that reruns give the same seeds and event ids
+        manifest = load_manifest(manifest_path)
+        check_manifest(manifest, evt_num, evts_per_job, particles, positions, momentums, base_seed=base_seed, start_evtid=start_evtid) #raises if the settings were changed (use --replan)
+        print(f"Using the manifest {manifest_path}")
+    else:
+        manifest = plan_shards(evt_num, evts_per_job, particles, positions, momentums, base_seed=base_seed, start_evtid=start_evtid)
+        save_manifest(manifest, manifest_path)
+        print(f"Planned {len(manifest['jobs'])} jobs in {manifest_path}")
+    #endregion
+
+    #region Simulation
+    if condor:
+        script_path = os.path.abspath(__file__)
+        js.sub_job(os.path.dirname(script_path), f"python {script_path} --job ${{RUN}}", len(manifest["jobs"]), setup_script=SETUP_SCRIPT)
+    else:
+        load_env(SETUP_SCRIPT)
+        TUTORIALROOT = os.environ["TUTORIALROOT"]
+        tasks = [(str(job["job"]), partial(run_job, job, TUTORIALROOT, output_dir, log_dir)) for job in manifest["jobs"]]
+        error_count = 0
+        for job_nm, e in run_tasks(tasks, worker_num=worker_num).items():
+            if e is not None:
+                error_count += 1
+                print(f"[ERROR] detsim failed for job {job_nm}: {e}")
+        print(f"Done. Total errors: {error_count}")
+    #endregion
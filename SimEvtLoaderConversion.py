@@ -1,6 +1,11 @@
-import subprocess
 import os
-import shutil
+import sys
+import json
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
+
+from utils.file_transfer import transfer_file
+from utils.executor import run_tasks
 from lib.sim.validation import delete_failed_runs, move_excess_runs
 from lib.sim.metadata import create_metadata_file
 
@@ -10,6 +15,9 @@ dir_nm = "Simulation_Muon_J24" #has to be changed correctly!
 elec_type = "_"+"det2elec"
 rec_type = "_"+"det2elec2rec"
 #rec_type = "_"+"det2rec"
+transfer_modes = ["hardlink", "reflink", "copy"] #tried in this order for every file, "symlink" needs no storage either but depends on the simulation directory
+worker_num = 8 #maximum number of runs transferred in parallel (matters for copies)
+incremental = True #True: only runs which aren't in convert_index.json yet are converted and numbered after the existing ones, False: everything is converted again from 0
 TUTORIALROOT = os.environ["TUTORIALROOT"]
 workspace = os.environ.get("WORKSPACE")
 
@@ -55,6 +63,7 @@ output_dir_rec = os.path.join(data_dir, "rec")
 os.makedirs(output_dir_rec, exist_ok=True)
 
 output_path_log = os.path.join(data_dir,"convert_log.txt")
+output_path_index = os.path.join(data_dir,"convert_index.json") #basename -> simulation number of all converted runs
 
 
 
@@ -67,78 +76,86 @@ def extract_basename(filename):
         name = name[:seed_pos + len('seed')]
     return name
 
-input_files_det_edm = [extract_basename(f) for f in os.listdir(input_dir_det) if f.endswith(".root") and "user" not in f]
-input_files_det_usr = [extract_basename(f) for f in os.listdir(input_dir_det) if f.endswith(".root") and "user"  in f]
-input_files_elec_edm = [extract_basename(f) for f in os.listdir(input_dir_elec) if f.endswith(".root") and "user" not in f]
-input_files_elec_usr = [extract_basename(f) for f in os.listdir(input_dir_elec) if f.endswith(".root") and "user"  in f]
-input_files_rec_edm = [extract_basename(f) for f in os.listdir(input_dir_rec) if f.endswith(".root") and "user" not in f]
-input_files_rec_usr = [extract_basename(f) for f in os.listdir(input_dir_rec) if f.endswith(".root") and "user"  in f]
-
-input_files_basenames = sorted(
-    set(input_files_det_edm)
-  & set(input_files_det_usr)
-  & set(input_files_elec_edm)
-  & set(input_files_elec_usr)
-  & set(input_files_rec_edm)
-  & set(input_files_rec_usr))
+def scan_basenames(input_dir): #basenames with the edm and the user file (one listdir per directory)
+    filenames = [f for f in os.listdir(input_dir) if f.endswith(".root")]
+    return set(extract_basename(f) for f in filenames if "user" not in f) & set(extract_basename(f) for f in filenames if "user" in f)
 
+input_files_basenames = sorted(scan_basenames(input_dir_det) & scan_basenames(input_dir_elec) & scan_basenames(input_dir_rec))
 
-with open(output_path_log, "w") as f:
-        f.write(f'Conversion Log of {dir_nm} to {dir_nm}{rec_type}_EvtLoader'+"\n")
-        f.write("\n")
 
-error_count = 0 
+def write_atomic(file_path, text): #written under a temporary name and moved into place, so that an interrupted run never leaves a truncated file
+    tmp_path = f"{file_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, file_path)
 
-for i, basename in enumerate(input_files_basenames, start=1):
-    print(f"[{i}/{len(input_files_basenames)}] doing conversion for {basename}") 
+def convert_run(transfers): #transfers of one run: (source, destination)
+    for src, dst in transfers:
+        mode = transfer_file(src, dst, modes=transfer_modes)
+        print(f'      {os.path.basename(src)} -> {os.path.basename(dst)} ({mode})')
 
-    #original path
-    
-    det_edm_src = os.path.join(input_dir_det, f"{basename}_det.root")
-    det_usr_src = os.path.join(input_dir_det, f"{basename}_det_user.root")
+def get_transfers(basename, n): #files of a run with simulation number n
+    transfers = [
+        (os.path.join(input_dir_det, f"{basename}_det.root"), os.path.join(output_dir_det, f"det_edm_{n}.root")),
+        (os.path.join(input_dir_det, f"{basename}_det_user.root"), os.path.join(output_dir_det, f"det_usr_{n}.root")),
+    ]
     if rec_type == "_det2elec2rec":
-        elec_edm_src = os.path.join(input_dir_elec, f"{basename}{elec_type}.root")
-        elec_usr_src = os.path.join(input_dir_elec, f"{basename}{elec_type}_user.root")
-    rec_edm_src = os.path.join(input_dir_rec, f"{basename}{rec_type}.root")
-    rec_usr_src = os.path.join(input_dir_rec, f"{basename}{rec_type}_user.root")
-
-    #destination path
-    det_edm_dst = os.path.join(output_dir_det, f"det_edm_{i-1-error_count}.root")
-    det_usr_dst = os.path.join(output_dir_det, f"det_usr_{i-1-error_count}.root")
-    if rec_type == "_det2elec2rec":
-        elec_edm_dst = os.path.join(output_dir_elec, f"elec_edm_{i-1-error_count}.root")
-        elec_usr_dst = os.path.join(output_dir_elec, f"elec_usr_{i-1-error_count}.root")
-    rec_edm_dst = os.path.join(output_dir_rec, f"rec_edm_{i-1-error_count}.root")
-    rec_usr_dst = os.path.join(output_dir_rec, f"rec_usr_{i-1-error_count}.root")
-
-    try:
-        shutil.copy2(det_edm_src, det_edm_dst)
-        shutil.copy2(det_usr_src, det_usr_dst)
-        print('      det converted')
-        if rec_type == "_det2elec2rec":
-            shutil.copy2(elec_edm_src, elec_edm_dst)
-            shutil.copy2(elec_usr_src, elec_usr_dst)
-            print('      elec converted')
-        shutil.copy2(rec_edm_src, rec_edm_dst)
-        shutil.copy2(rec_usr_src, rec_usr_dst)
-        print('      rec converted')
-
-        with open(output_path_log, "a") as f:
-            f.write(f"{basename} → Simulation Number {i-1-error_count} as {rec_type}\n")
-
-    except Exception as e:
+        transfers += [
+            (os.path.join(input_dir_elec, f"{basename}{elec_type}.root"), os.path.join(output_dir_elec, f"elec_edm_{n}.root")),
+            (os.path.join(input_dir_elec, f"{basename}{elec_type}_user.root"), os.path.join(output_dir_elec, f"elec_usr_{n}.root")),
+        ]
+    transfers += [
+        (os.path.join(input_dir_rec, f"{basename}{rec_type}.root"), os.path.join(output_dir_rec, f"rec_edm_{n}.root")),
+        (os.path.join(input_dir_rec, f"{basename}{rec_type}_user.root"), os.path.join(output_dir_rec, f"rec_usr_{n}.root")),
+    ]
+    return transfers
+
+
+#region Conversion
+index = {}
+log_lines = [f'Conversion Log of {dir_nm} to {dir_nm}{rec_type}_EvtLoader', '']
+if incremental and os.path.isfile(output_path_index):
+    with open(output_path_index, "r") as f:
+        index = json.load(f)
+    if os.path.isfile(output_path_log):
+        with open(output_path_log, "r") as f:
+            log_lines = [line for line in f.read().splitlines() if not line.startswith("Run_num:")]
+new_basenames = [basename for basename in input_files_basenames if basename not in index]
+first_n = max(index.values()) + 1 if index else 0
+print(f"{len(index)} runs already converted, converting {len(new_basenames)} new runs from simulation number {first_n}")
+
+# every new run is transferred to the slot of its position, the failed runs are removed afterwards and the later runs renamed (no byte copying)
+tasks = [(basename, partial(convert_run, get_transfers(basename, first_n + i))) for i, basename in enumerate(new_basenames)]
+errors = run_tasks(tasks, worker_num=worker_num, mem_per_task=None)
+
+error_count = 0
+for i, basename in enumerate(new_basenames):
+    transfers = get_transfers(basename, first_n + i)
+    e = errors[basename]
+    if e is not None: #not added to the index, so the run is tried again next time
         error_count += 1
-        with open(output_path_log, "a") as f:
-            f.write(f"Error with {basename}: {e}\n")
-        print("an error occured") 
-
-with open(output_path_log, "a") as f:
-            f.write(f"Run_num: {len(input_files_basenames)-error_count}\n")
+        for src, dst in transfers:
+            if os.path.lexists(dst):
+                os.remove(dst)
+        log_lines.append(f"Error with {basename}: {e}")
+        print(f"[{i+1}/{len(new_basenames)}] an error occured for {basename}: {e}")
+        continue
+    n = first_n + i - error_count
+    if n != first_n + i:
+        for (src, dst), (_, new_dst) in zip(transfers, get_transfers(basename, n)):
+            os.replace(dst, new_dst)
+    index[basename] = n
+    log_lines.append(f"{basename} → Simulation Number {n} as {rec_type}")
+log_lines.append(f"Run_num: {len(index)}")
+
+write_atomic(output_path_index, json.dumps(index, indent=1))
+write_atomic(output_path_log, "\n".join(log_lines) + "\n")
+#endregion
 
 #print('copy to data')
 
 #shutil.copytree(output_dir, data_dir, dirs_exist_ok=True)
 print('check simulation')
-delete_failed_runs(f"{dir_nm}{rec_type}_EvtLoader", run_num=len(input_files_basenames)-error_count, deleting = False )
+delete_failed_runs(f"{dir_nm}{rec_type}_EvtLoader", run_num=len(index), deleting = False )
 print('create metadata file')
 create_metadata_file(f"{dir_nm}{rec_type}_EvtLoader")
@@ -31,29 +31,64 @@
 
 
 
-import subprocess
+# Every file runs through its own chain of stages (detsim -> det2rec and detsim -> det2elec -> elec2rec),
+# a stage of a file starts as soon as the stage before is finished for this file. Analysis.py runs at the end.
+# The simulation parameters are taken from DetSim.py, the other stages use the same commands as their scripts.
+
 import os
+import sys
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
+
+import DetSim
+from utils.stages import STAGE_DIR_NMS, det2elec_cmd, elec2rec_cmd, det2rec_cmd, run_stage
+from utils.pipeline import Task, run_pipeline
+from utils.executor import get_worker_num, run_cmd
+from utils.env_utils import SETUP_SCRIPT, load_env
 
-setup_script = "/storage/gpfs_data/juno/junofs/users/siebert/setupscript.sh"
+#region JUNOSW
+# environment after sourcing the setup script (cached snapshot, see utils/env_utils.py), inherited by all stages
+load_env(SETUP_SCRIPT)
+#endregion
 
+#Settings
+max_workers = get_worker_num() #maximum number of stages running at the same time (limited by the cores and the available memory)
+evtmax = "-1" #events of det2elec, elec2rec and det2rec (-1 = all)
+run_analysis = True
+force = "--force" in sys.argv #reruns stages whose outputs are up to date (same input file and command)
+
+TUTORIALROOT = os.environ["TUTORIALROOT"]
+print(f'{TUTORIALROOT=}')
 workspace = os.environ.get("WORKSPACE")
-dir_nm = "SimulationScripts"
-base_dir = os.path.join(workspace, dir_nm)
-
-scripts = [
-    os.path.join(base_dir, "DetSim.py"),
-    os.path.join(base_dir, "det2rec.py"),
-    os.path.join(base_dir, "det2elec.py"),
-    os.path.join(base_dir, "elec2rec.py"),
-    os.path.join(base_dir, "Analysis.py"),
-]
-
-for i, script in enumerate(scripts, start=1):
-    print(f"[{i}/{len(scripts)}] Running {script} ...")
-    # Hier wird zuerst das Setup-Script gesourced, dann das Python-Script gestartet
-    #cmd = f"bash -c 'source {setup_script} && python {script}'"
-    cmd = f"python {script}"
-    result = subprocess.run(cmd, shell=True, executable="/bin/bash")
-    if result.returncode != 0:
-        print(f"Script {script} failed with exit code {result.returncode}")
-        break
+if workspace is None:
+    raise RuntimeError("environment variable WORKSPACE is not set!")
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+output_dirs = {stage_nm: os.path.join(workspace, DetSim.dir_nm, stage_dir_nm) for stage_nm, stage_dir_nm in STAGE_DIR_NMS.items()}
+for output_dir in output_dirs.values():
+    os.makedirs(output_dir, exist_ok=True)
+log_dir = os.path.join(workspace, DetSim.dir_nm, "logs") #output of the single runs, one directory per stage
+
+def get_log_path(stage_nm, file_nm):
+    return os.path.join(log_dir, stage_nm, f"{file_nm}.log")
+
+#Tasks
+tasks = []
+detsim_cmds = DetSim.get_detsim_cmds(TUTORIALROOT, output_dirs["detsim"])
+for j, i, seed, cmd, output_file, user_output_file, evtids in detsim_cmds:
+    file_nm = os.path.splitext(os.path.basename(output_file))[0]
+    tasks.append(Task(f"detsim:{file_nm}", partial(run_cmd, cmd, get_log_path("detsim", file_nm))))
+    cmd, rec_output_file, rec_user_output_file = det2rec_cmd(TUTORIALROOT, output_file, output_dirs["det2rec"], evtmax=evtmax)
+    tasks.append(Task(f"det2rec:{file_nm}", partial(run_stage, cmd, output_file, [rec_output_file, rec_user_output_file], force=force, log_pth=get_log_path("det2rec", file_nm)), deps=[f"detsim:{file_nm}"]))
+    cmd, elec_output_file, elec_user_output_file = det2elec_cmd(TUTORIALROOT, output_file, output_dirs["det2elec"], evtmax=evtmax)
+    tasks.append(Task(f"det2elec:{file_nm}", partial(run_stage, cmd, output_file, [elec_output_file, elec_user_output_file], force=force, log_pth=get_log_path("det2elec", file_nm)), deps=[f"detsim:{file_nm}"]))
+    cmd, rec_output_file, rec_user_output_file = elec2rec_cmd(TUTORIALROOT, elec_output_file, output_dirs["elec2rec"], evtmax=evtmax)
+    tasks.append(Task(f"elec2rec:{file_nm}", partial(run_stage, cmd, elec_output_file, [rec_output_file, rec_user_output_file], force=force, log_pth=get_log_path("elec2rec", file_nm)), deps=[f"det2elec:{file_nm}"]))
+if run_analysis:
+    rec_task_nms = [task.nm for task in tasks if task.nm.split(":")[0] in ["det2rec", "elec2rec"]]
+    tasks.append(Task("analysis", ["python", os.path.join(base_dir, "Analysis.py")], deps=rec_task_nms))
+
+states = run_pipeline(tasks, max_workers=max_workers)
+DetSim.write_detsim_index([detsim_cmd for detsim_cmd in detsim_cmds if states[f"detsim:{os.path.splitext(os.path.basename(detsim_cmd[4]))[0]}"] == "done"], output_dirs["detsim"]) #only successfully simulated files
+error_count = sum(state != "done" for state in states.values())
+print(f"Done. Total errors (failed or skipped stages): {error_count}")
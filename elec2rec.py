@@ -3,35 +3,26 @@
 
 import subprocess
 import os
+import sys
 import random
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #important for importing from utils
+
+from utils.stages import elec2rec_cmd, run_stage
+from utils.executor import run_tasks
+from utils.env_utils import SETUP_SCRIPT, load_env
 
 #region JUNOSW
-# # Pfad zu deinem Setupscript
-# SETUP_SCRIPT = "/storage/gpfs_data/juno/junofs/users/siebert/setupscript.sh"
-
-# # Befehl: sourcen und dann alle Umgebungsvariablen ausgeben
-# cmd = f"source {SETUP_SCRIPT} && env"
-
-# # Subprozess mit Bash starten
-# proc = subprocess.Popen(
-#     cmd,
-#     shell=True,
-#     executable="/bin/bash",
-#     stdout=subprocess.PIPE
-# )
-
-# # Alle Variablen aus subprocess in das aktuelle Python-Environment laden
-# for line in proc.stdout:
-#     key, _, value = line.decode("utf-8").partition("=")
-#     os.environ[key] = value.strip()
-
-# TUTORIALROOT = os.environ["TUTORIALROOT"]
-# print(f'{TUTORIALROOT=}')      
+# environment after sourcing the setup script (cached snapshot, see utils/env_utils.py)
+if "TUTORIALROOT" not in os.environ:
+    load_env(SETUP_SCRIPT)
 #endregion
 
 #Settings
 dir_nm = "Simulation_Muon" #has to be changed correctly!
 evtmax = "-1" #has to be checked
+force = "--force" in sys.argv #reruns files whose outputs are up to date (same input file and command)
+worker_num = None #maximum number of files processed in parallel (None = limited by the cores and the available memory)
 
 
 TUTORIALROOT = os.environ["TUTORIALROOT"]
@@ -46,45 +37,33 @@ if not os.path.isdir(input_dir):
     raise RuntimeError(f"Input directory doesn't exist: {input_dir}")
 output_dir = os.path.join(workspace, dir_nm, "elec2rec")
 os.makedirs(output_dir, exist_ok=True)
+log_dir = os.path.join(workspace, dir_nm, "logs", "elec2rec") #output of the single runs
 
 
 input_files = [f for f in os.listdir(input_dir) if f.endswith(".root") and "user" not in f]
 
-error_count = 0
+def run_file(i, input_filename, cmd, input_path, output_paths):  #runs elec2rec on one file (skipped if the outputs are up to date)
+    print(f"[{i}/{len(input_files)}] Running elec2rec on {input_filename}")
+    log_path = os.path.join(log_dir, f"{os.path.splitext(input_filename)[0]}.log")
+    if not run_stage(cmd, input_path, output_paths, force=force, log_pth=log_path):
+        print(f"outputs of {input_filename} are up to date, skipped")
 
+tasks = []
 for i, input_filename in enumerate(input_files, start=1):
     input_path = os.path.join(input_dir, input_filename)
 
     seed = random.randint(0, 32767)
 
-    base, ext = os.path.splitext(input_filename)
-    output_filename = f"{base}2rec{ext}"
-    user_output_filename = f"{base}2rec_user{ext}"
-
-    output_path = os.path.join(output_dir, output_filename)
-    user_output_path = os.path.join(output_dir, user_output_filename)
+    cmd, output_path, user_output_path = elec2rec_cmd(TUTORIALROOT, input_path, output_dir, evtmax=evtmax)
+    tasks.append((input_filename, partial(run_file, i, input_filename, cmd, input_path, [output_path, user_output_path])))
 
-    
-
-    cmd = [
-        "python", f"{TUTORIALROOT}/share/tut_rtraw2rec.py",  #tut_rtraw2rec.py or tut_elec2rec.py: No such file or directory
-        "--evtmax", evtmax,
-        "--input", input_path,
-        #"--Algorithm omilrec",
-        #"--seed", str(seed),
-        "--output", output_path,
-        "--user-output", user_output_path,
-        "--EnableUserOutput",
-        "--method", "energy-point" 
-    ]
+error_count = 0
 
-    print(f"[{i}/{len(input_files)}] Running elec2rec on {input_filename}")
-    try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as e:
+for input_filename, e in run_tasks(tasks, worker_num=worker_num).items():
+    if isinstance(e, subprocess.CalledProcessError):
         error_count += 1
         print(f"[ERROR] det2elec failed on {input_filename}: {e}")
-    except Exception as e:
+    elif e is not None:
         error_count += 1
         print(f"[EXCEPTION] Unexpected error on {input_filename}: {e}")
 
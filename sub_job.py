@@ -47,4 +47,4 @@ cmd = f"python {script_path}"
 run_num = 1
 
 # Job absenden
-js.sub_job(dir, cmd, run_num)
\ No newline at end of file
+js.sub_job(dir, cmd, run_num, setup_script=setup_script) #the jobs source a cached environment snapshot of the setup script
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Test setup. The utils modules read WORKSPACE and JUNOTOP on import, so both point to a temporary
+directory before any test module is imported: the caches are written there and the PMT geometry
+is a small synthetic one (LPMT ids 0-39, SPMT ids 100-119).
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #important for importing from utils
+
+
+def _write_geometry(junotop):
+    geometry_dir = f"{junotop}/data/Detector/Geometry"
+    os.makedirs(geometry_dir)
+    rng = np.random.default_rng(0)
+    for pmt_typ, ids, mfrs in [("LPMT", range(0, 40), ["Hamamatsu", "HighQENNVT"]), ("SPMT", range(100, 120), ["HZC"])]:
+        with open(f"{geometry_dir}/PMTPos_CD_{pmt_typ}.csv", "w") as f:
+            f.write("# copyNo theta phi\n")
+            for pmt_id in ids:
+                f.write(f"{pmt_id} {rng.uniform(0, 180):.4f} {rng.uniform(0, 360):.4f}\n")
+        with open(f"{geometry_dir}/PMTType_CD_{pmt_typ}.csv", "w") as f:
+            f.write("# copyNo type\n")
+            for pmt_id in ids:
+                f.write(f"{pmt_id} {mfrs[pmt_id % len(mfrs)]}\n")
+
+
+_tmp_dir = tempfile.mkdtemp(prefix="juno_tests_")
+os.environ["WORKSPACE"] = f"{_tmp_dir}/workspace"
+os.environ["JUNOTOP"] = f"{_tmp_dir}/junotop"
+os.makedirs(os.environ["WORKSPACE"])
+_write_geometry(os.environ["JUNOTOP"])
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils import cache_utils as cu
+
+
+def _write_hits(writers, src_pth, scale=1):
+    hit_times = np.loadtxt(src_pth, ndmin=1) * scale
+    for store_nm, writer in writers.items():
+        writer.append(hit_times, np.arange(len(hit_times)))
+
+
+@pytest.fixture
+def src_pth(tmp_path):
+    src_pth = tmp_path / "src.txt"
+    src_pth.write_text("1 2 3")
+    return str(src_pth)
+
+
+def test_save_load_arrs(tmp_path):
+    cache_pth = str(tmp_path / "cache" / "entry")
+    cu.save_arrs(cache_pth, "key", a=np.arange(5), b=np.ones((2, 3)))
+    arrs = cu.load_arrs(cache_pth, "key")
+    assert np.array_equal(arrs["a"], np.arange(5)) and arrs["b"].shape == (2, 3)
+    assert cu.load_arrs(cache_pth, "other key") is None
+    assert cu.load_arrs(str(tmp_path / "missing"), "key") is None
+    assert os.listdir(tmp_path / "cache") == ["entry"]
+
+
+def test_get_key(src_pth):
+    key = cu.get_key(src_pth, version=1, a=1)
+    assert key == cu.get_key(src_pth, version=1, a=1)
+    assert key != cu.get_key(src_pth, version=2, a=1)
+    assert key != cu.get_key(src_pth, version=1, a=2)
+    os.utime(src_pth, ns=(0, 0))
+    assert key != cu.get_key(src_pth, version=1, a=1)
+
+
+def test_get_cached_hit_stores(tmp_path, src_pth):
+    calls = []
+    def write_hits(writers, *src_pths, **pars):
+        calls.append(src_pths)
+        _write_hits(writers, *src_pths, **pars)
+    cache_dir = str(tmp_path / "cache")
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["lpmt", "spmt"], version=1)
+    assert list(hit_stores["spmt"][0]["hit_times"]) == [1, 2, 3]
+    ### Cached
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["lpmt", "spmt"], version=1)
+    assert len(calls) == 1 and list(hit_stores["lpmt"][0]["hit_times"]) == [1, 2, 3]
+    ### Written again for another version, other parameters or a changed source file
+    cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["lpmt", "spmt"], version=2)
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["lpmt", "spmt"], version=2, scale=2)
+    assert len(calls) == 3 and list(hit_stores["lpmt"][0]["hit_times"]) == [2, 4, 6]
+    with open(src_pth, "w") as f:
+        f.write("4 5")
+    hit_stores = cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["lpmt", "spmt"], version=2, scale=2)
+    assert len(calls) == 4 and list(hit_stores["lpmt"][0]["hit_times"]) == [8, 10]
+
+
+def test_get_cached_hit_stores_failed(tmp_path, src_pth):
+    def write_hits(writers, src_pth):
+        writers["det"].append([1.0], [1])
+        raise RuntimeError("extraction failed")
+    cache_dir = str(tmp_path / "cache")
+    os.makedirs(cache_dir)
+    with pytest.raises(RuntimeError):
+        cu.get_cached_hit_stores(cache_dir, [src_pth], write_hits, ["det"])
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,50 @@
+import os
+import subprocess
+
+import pytest
+
+from utils import env_utils as eu
+
+
+@pytest.fixture
+def setup_script(tmp_path, monkeypatch):
+    monkeypatch.setattr(eu, "ENV_CACHE_DIR", str(tmp_path / "cache"))
+    setup_script = tmp_path / "setup.sh"
+    setup_script.write_text("export TUTORIALROOT=/opt/tut\nexport JUNOTOP='/opt/juno top'\nexport PATH=/opt/juno/bin:$PATH\n")
+    return str(setup_script)
+
+
+def test_get_env(setup_script, monkeypatch):
+    monkeypatch.setenv("SESSION_VAR", "1")
+    env = eu.get_env(setup_script)
+    assert env["TUTORIALROOT"] == "/opt/tut" and env["JUNOTOP"] == "/opt/juno top"
+    assert env["PATH"].startswith("/opt/juno/bin:")
+    assert "SESSION_VAR" not in env and "PWD" not in env
+
+
+def test_get_env_already_set(setup_script, monkeypatch):
+    # Variables the caller already has are part of the snapshot too (e.g. for the HTCondor jobs)
+    monkeypatch.setenv("TUTORIALROOT", "/opt/tut")
+    monkeypatch.setenv("JUNOTOP", "/opt/juno top")
+    monkeypatch.setenv("PATH", f"/opt/juno/bin:{os.environ['PATH']}")
+    env = eu.get_env(setup_script)
+    assert env["TUTORIALROOT"] == "/opt/tut" and env["JUNOTOP"] == "/opt/juno top"
+
+
+def test_get_env_cached(setup_script, monkeypatch):
+    env = eu.get_env(setup_script)
+    source_env = eu._source_env
+    monkeypatch.setattr(eu, "_source_env", lambda setup_script: pytest.fail("The cached snapshot is not used"))
+    assert eu.get_env(setup_script) == env
+    ### A changed setup script is sourced again
+    monkeypatch.setattr(eu, "_source_env", source_env)
+    with open(setup_script, "a") as f:
+        f.write("export NEW_VAR=1\n")
+    assert eu.get_env(setup_script)["NEW_VAR"] == "1"
+
+
+def test_get_env_sh(setup_script):
+    sh_file_pth = eu.get_env_sh(setup_script)
+    cmd = f"source {sh_file_pth} && printf '%s|%s' \"$TUTORIALROOT\" \"$JUNOTOP\""
+    output = subprocess.run(cmd, shell=True, executable="/bin/bash", env={}, stdout=subprocess.PIPE, check=True).stdout
+    assert output.decode() == "/opt/tut|/opt/juno top"
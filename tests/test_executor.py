@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from utils import executor as ex
+
+
+def test_get_worker_num(monkeypatch):
+    monkeypatch.setattr(ex, "get_available_mem", lambda: 10 * 2**30)
+    assert ex.get_worker_num(mem_per_task=4 * 2**30) == min(2, ex.get_worker_num(mem_per_task=0))
+    assert ex.get_worker_num(mem_per_task=0, max_worker_num=1) == 1
+    assert ex.get_worker_num(mem_per_task=2**40) == 1  # at least one worker
+
+
+def test_run_cmd(tmp_path):
+    log_pth = str(tmp_path / "logs" / "task.log")
+    ex.run_cmd([sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"], log_pth=log_pth)
+    with open(log_pth, "r") as f:
+        assert f.read().split() == ["out", "err"]
+    with pytest.raises(subprocess.CalledProcessError):
+        ex.run_cmd([sys.executable, "-c", "raise SystemExit(3)"], log_pth=log_pth)
+
+
+def test_run_tasks(monkeypatch):
+    monkeypatch.setattr(ex, "get_worker_num", lambda *args, **kwargs: 2)
+    barrier = threading.Barrier(2, timeout=10)  # both tasks have to run at the same time
+    def fail():
+        raise ValueError("failed")
+    errors = ex.run_tasks([("b", barrier.wait), ("a", barrier.wait), ("c", fail)], worker_num=2)
+    assert list(errors) == ["b", "a", "c"]
+    assert errors["a"] is None and errors["b"] is None and isinstance(errors["c"], ValueError)
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from utils import file_transfer as ft
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / "src" / "mu-_1_det.root"
+    src.parent.mkdir()
+    src.write_bytes(os.urandom(3 * 2**20))
+    (tmp_path / "dst").mkdir()
+    return str(src)
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "symlink", "copy"])
+def test_transfer_file(tmp_path, src, mode):
+    dst = str(tmp_path / "dst" / "det_edm_0.root")
+    assert ft.transfer_file(src, dst, modes=[mode]) == mode
+    assert ft.get_checksum(dst) == ft.get_checksum(src)
+    assert os.path.samefile(src, dst) == (mode != "copy")
+    assert os.path.islink(dst) == (mode == "symlink")
+    assert os.listdir(tmp_path / "dst") == ["det_edm_0.root"]
+
+
+def test_replace(tmp_path, src):
+    dst = tmp_path / "dst" / "det_edm_0.root"
+    dst.write_text("old")
+    ft.transfer_file(src, str(dst), modes=["copy"])
+    assert ft.get_checksum(str(dst)) == ft.get_checksum(src)
+
+
+def test_fallback(tmp_path, src, monkeypatch):
+    def reflink(src, dst):
+        open(dst, "wb").close()
+        raise OSError(95, "Operation not supported")
+    monkeypatch.setattr(ft, "_reflink", reflink)
+    dst = str(tmp_path / "dst" / "det_edm_0.root")
+    assert ft.transfer_file(src, dst, modes=["reflink", "copy"]) == "copy"
+    assert ft.get_checksum(dst) == ft.get_checksum(src)
+    assert os.listdir(tmp_path / "dst") == ["det_edm_0.root"]
+
+
+def test_failed_transfer(tmp_path, src, monkeypatch):
+    # A copy interrupted half-way (e.g. ENOSPC) leaves neither the destination nor a temporary file
+    def copy2(src, dst):
+        with open(dst, "wb") as f:
+            f.write(b"partial")
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(ft.shutil, "copy2", copy2)
+    dst = str(tmp_path / "dst" / "det_edm_0.root")
+    with pytest.raises(OSError, match="No space left"):
+        ft.transfer_file(src, dst, modes=["copy"])
+    assert os.listdir(tmp_path / "dst") == []
+
+
+def test_failed_verification(tmp_path, src, monkeypatch):
+    def copy2(src, dst):
+        with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+            f_dst.write(bytes(len(f_src.read())))  # same size, other data
+    monkeypatch.setattr(ft.shutil, "copy2", copy2)
+    dst = str(tmp_path / "dst" / "det_edm_0.root")
+    with pytest.raises(OSError, match="Checksum mismatch"):
+        ft.transfer_file(src, dst, modes=["copy"])
+    assert os.listdir(tmp_path / "dst") == []
+
+
+def test_unknown_mode(tmp_path, src):
+    with pytest.raises(ValueError):
+        ft.transfer_file(src, str(tmp_path / "dst" / "det_edm_0.root"), modes=["move"])
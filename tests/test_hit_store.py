@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.hit_store import HitStoreWriter, HitStore, write_hit_store
+
+
+def _get_evts(evt_num=20, seed=0):
+    rng = np.random.default_rng(seed)
+    evts = []
+    for _ in range(evt_num):
+        hit_num = int(rng.integers(0, 50))  # also events without hits
+        evts.append({
+            "hit_times": rng.uniform(0, 1000, hit_num),
+            "hit_pmt_ids": rng.integers(0, 45000, hit_num),
+            "hit_charges": rng.uniform(0, 10, hit_num),
+            "pos": tuple(rng.uniform(-17000, 17000, 3)),
+        })
+    return evts
+
+
+def test_round_trip(tmp_path):
+    evts = _get_evts()
+    hit_store = write_hit_store(str(tmp_path / "evts.hits"), evts, opt_hit_arr_nms=["hit_charges"])
+    assert len(hit_store) == len(evts)
+    assert hit_store.hit_arr_nms == ["hit_times", "hit_pmt_ids", "hit_charges"]
+    for evt, stored_evt in zip(evts, hit_store):
+        assert np.array_equal(stored_evt["hit_times"], evt["hit_times"].astype(np.float32))
+        assert np.array_equal(stored_evt["hit_pmt_ids"], evt["hit_pmt_ids"])
+        assert np.array_equal(stored_evt["hit_charges"], evt["hit_charges"].astype(np.float32))
+        assert stored_evt["pos"] == evt["pos"]
+    assert np.array_equal(hit_store[-1]["hit_times"], hit_store[len(evts) - 1]["hit_times"])
+    with pytest.raises(IndexError):
+        hit_store[len(evts)]
+
+
+def test_empty_store(tmp_path):
+    hit_store = write_hit_store(str(tmp_path / "empty.hits"), [])
+    assert len(hit_store) == 0
+    assert list(hit_store) == []
+
+
+def test_meta(tmp_path):
+    with HitStoreWriter(str(tmp_path / "evts.hits"), key="abc") as writer:
+        writer.append([1.0], [2])
+    hit_store = HitStore(str(tmp_path / "evts.hits"))
+    assert hit_store.meta == {"key": "abc"}
+    assert np.isnan(hit_store[0]["pos"]).all()
+
+
+def test_failed_write(tmp_path):
+    store_pth = str(tmp_path / "evts.hits")
+    write_hit_store(store_pth, _get_evts(3))
+    with pytest.raises(RuntimeError):
+        with HitStoreWriter(store_pth) as writer:
+            writer.append([1.0], [2])
+            raise RuntimeError("extraction failed")
+    # The previous store is kept and no temporary store is left
+    assert len(HitStore(store_pth)) == 3
+    assert os.listdir(tmp_path) == ["evts.hits"]
+
+
+def test_missing_hit_arr(tmp_path):
+    with HitStoreWriter(str(tmp_path / "evts.hits"), opt_hit_arr_nms=["hit_charges"]) as writer:
+        with pytest.raises(AssertionError):
+            writer.append([1.0], [2])
+        with pytest.raises(AssertionError):
+            writer.append([1.0, 2.0], [2], hit_charges=[1.0, 1.0])
@@ -0,0 +1,71 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from utils import hit_time_utils as htu
+from utils.ana_tools import Hist
+
+
+def _ref_align_shift(hit_times, prominence, max_ratio=0.1, offset=2):
+    # Original implementation with Hist (full peak search and walk back bin by bin)
+    x_min, x_max = max(int(hit_times.min()), -100000), min(int(hit_times.max()), 100000)
+    hist = Hist()
+    hist.set_bins(x_max-x_min, x_min, x_max)
+    hist.fill(hit_times)
+    hist.smooth()
+    peak_bin_idcs = hist.get_peak_bin_idcs(prominence)
+    bin_idx = peak_bin_idcs[0] if len(peak_bin_idcs) > 0 else hist.get_max_bin_idx()
+    max_val = hist.get_val(bin_idx)
+    while bin_idx > 0 and hist.get_val(bin_idx) >= max_ratio*max_val:
+        bin_idx -= 1
+    return - (hist.get_x_val(bin_idx) - 0.5) + offset
+
+
+def _get_evts(seed, evt_num=60):
+    # Muon-like events: a peak with a tail, some with dark hits over a wide range
+    rng = np.random.default_rng(seed)
+    evts = []
+    for _ in range(evt_num):
+        hit_num = int(rng.integers(20, 20000))
+        t0 = rng.uniform(-500, 500)
+        peak_num = int(hit_num * rng.uniform(0.3, 0.95))
+        hit_times = np.concatenate([
+            t0 + rng.exponential(rng.uniform(2, 40), peak_num) + rng.normal(0, rng.uniform(0.5, 5), peak_num),
+            t0 + rng.exponential(rng.uniform(50, 3000), hit_num - peak_num),
+            rng.uniform(-2000, 30000, int(rng.integers(0, 300))) if rng.random() < 0.5 else [],
+        ])
+        if rng.random() < 0.3:
+            hit_times = np.floor(hit_times)  # integer times on the bin edges
+        evts.append(hit_times.astype(rng.choice([np.float32, np.float64])))
+    return evts
+
+
+@pytest.fixture(autouse=True)
+def ignore_no_peak_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+@pytest.mark.parametrize("prominence", [5, 20, 80])
+def test_get_align_shift(prominence):
+    for hit_times in _get_evts(prominence):
+        assert htu.get_align_shift(hit_times, prominence) == _ref_align_shift(hit_times, prominence)
+
+
+@pytest.mark.parametrize("max_bin_num", [2**24, 5000])
+def test_get_align_shifts(max_bin_num):
+    evts = _get_evts(1) + [np.asarray([3.5]), np.asarray([1., 2., 3., 4.]), np.asarray([-2.5, 7.])]
+    shifts = htu.get_align_shifts(evts, 20, max_bin_num=max_bin_num)
+    assert list(shifts) == [htu.get_align_shift(hit_times, 20) for hit_times in evts]
+
+
+def test_align_many():
+    evts = _get_evts(2, evt_num=20)
+    aligned_evts, shifts = htu.align_many(evts, 20, rtn_align_shift=True)
+    for hit_times, aligned_hit_times, shift in zip(evts, aligned_evts, shifts):
+        ref_hit_times, ref_shift = htu.align(hit_times, 20, rtn_align_shift=True)
+        assert shift == ref_shift
+        assert aligned_hit_times.dtype == ref_hit_times.dtype and np.array_equal(aligned_hit_times, ref_hit_times)
+    assert htu.align_many([], 20) == []
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils import id_utils as iu
+
+
+ID_TABLE = {"pmt_ids": np.asarray([5, 9, 2**31 + 7], dtype=np.uint32), "copy_nos": np.asarray([0, 100, 39], dtype=np.int32)}
+
+
+@pytest.fixture
+def id_table(monkeypatch, tmp_path):
+    # The table is built by the IDService (ROOT) in production, here it is given
+    monkeypatch.setattr(iu, "build_id_table", lambda: ID_TABLE)
+    monkeypatch.setattr(iu, "ID_TABLE_CACHE_PTH", str(tmp_path / "pmt_id_table"))
+    monkeypatch.setattr(iu, "_id_table", None)
+    return tmp_path / "pmt_id_table"
+
+
+def test_id2copyNo(id_table):
+    copy_nos = iu.id2copyNo([9, 5, 2**31 + 7, 7, 0, 2**32 - 1])
+    assert copy_nos.dtype == np.int32
+    assert list(copy_nos) == [100, 0, 39, -1, -1, -1]
+    assert len(iu.id2copyNo([])) == 0
+    assert os.path.isdir(id_table)
+
+
+def test_id2copyNo_cached(id_table, monkeypatch):
+    iu.id2copyNo([5])
+    monkeypatch.setattr(iu, "_id_table", None)
+    monkeypatch.setattr(iu, "build_id_table", lambda: pytest.fail("The cached table is not used"))
+    assert list(iu.id2copyNo([9])) == [100]
+
+
+def test_id2copyNo_read_only_cache(id_table, monkeypatch):
+    def save_arrs(*args, **kwargs):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(iu.cu, "save_arrs", save_arrs)
+    assert list(iu.id2copyNo([9, 7])) == [100, -1]
+
+
+def test_id2copyNo_empty_table(monkeypatch):
+    monkeypatch.setattr(iu, "_id_table", {"pmt_ids": np.zeros(0, dtype=np.uint32), "copy_nos": np.zeros(0, dtype=np.int32)})
+    assert list(iu.id2copyNo([1, 2])) == [-1, -1]
@@ -0,0 +1,71 @@
+import sys
+import threading
+
+import pytest
+
+from utils.pipeline import Task, run_pipeline
+
+
+def _get_chain_tasks(log, fail_nms=()):
+    # Two files with the chains detsim -> det2elec -> elec2rec and detsim -> det2rec
+    def run(nm):
+        def func():
+            with lock:
+                log.append(nm)
+            if nm in fail_nms:
+                raise RuntimeError(f"{nm} failed")
+        return func
+    lock = threading.Lock()
+    tasks = []
+    for file_nm in ["a", "b"]:
+        tasks += [
+            Task(f"detsim:{file_nm}", run(f"detsim:{file_nm}")),
+            Task(f"det2elec:{file_nm}", run(f"det2elec:{file_nm}"), deps=[f"detsim:{file_nm}"]),
+            Task(f"elec2rec:{file_nm}", run(f"elec2rec:{file_nm}"), deps=[f"det2elec:{file_nm}"]),
+            Task(f"det2rec:{file_nm}", run(f"det2rec:{file_nm}"), deps=[f"detsim:{file_nm}"]),
+        ]
+    return tasks
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_dependency_order(max_workers):
+    log = []
+    tasks = _get_chain_tasks(log)
+    states = run_pipeline(tasks, max_workers=max_workers)
+    assert states == {task.nm: "done" for task in tasks}
+    assert sorted(log) == sorted(task.nm for task in tasks)
+    for task in tasks:
+        assert all(log.index(dep) < log.index(task.nm) for dep in task.deps)
+
+
+def test_deepest_first():
+    # With one worker, the chain of the first file is finished before the second file is started
+    log = []
+    run_pipeline(_get_chain_tasks(log), max_workers=1)
+    assert log[:4] == ["detsim:a", "det2elec:a", "elec2rec:a", "det2rec:a"]
+
+
+def test_failure_propagation():
+    log = []
+    states = run_pipeline(_get_chain_tasks(log, fail_nms=["det2elec:a", "detsim:b"]), max_workers=2)
+    assert states == {
+        "detsim:a": "done", "det2elec:a": "failed", "elec2rec:a": "skipped", "det2rec:a": "done",
+        "detsim:b": "failed", "det2elec:b": "skipped", "elec2rec:b": "skipped", "det2rec:b": "skipped",
+    }
+    assert "elec2rec:a" not in log and "det2elec:b" not in log
+
+
+def test_command_tasks():
+    states = run_pipeline([
+        Task("ok", [sys.executable, "-c", "pass"]),
+        Task("fail", [sys.executable, "-c", "raise SystemExit(1)"]),
+        Task("after_fail", [sys.executable, "-c", "pass"], deps=["fail"]),
+    ])
+    assert states == {"ok": "done", "fail": "failed", "after_fail": "skipped"}
+
+
+def test_invalid_dependencies():
+    with pytest.raises(ValueError):
+        run_pipeline([Task("a", lambda: None, deps=["b"]), Task("b", lambda: None, deps=["a"])])
+    with pytest.raises(AssertionError):
+        run_pipeline([Task("a", lambda: None, deps=["missing"])])
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from utils import pmt_utils as pu
+
+
+EVT_POSS = [(0, 0, 0), (1000, -2000, 500), (0, 0, 17000), (-12000, 9000, -8000)]
+
+
+def test_geometry():
+    assert pu.max_pmt_id == 119
+    assert list(pu.pmt_typ([0, 39, 100, 119])) == ["lpmt", "lpmt", "spmt", "spmt"]
+    assert list(pu.pmt_mfr([0, 1, 100])) == ["Hamamatsu", "HighQENNVT", "HZC"]
+    assert pu.pmt_typ(50) is None
+    assert np.allclose(np.linalg.norm(pu.pmt_pos([0, 100]), axis=1), pu.R_PMT)
+
+
+@pytest.mark.parametrize("evt_pos", EVT_POSS)
+def test_pmt_tof_backends(evt_pos):
+    pmt_ids = np.random.default_rng(1).choice(np.r_[0:40, 100:120], size=500)
+    direct = pu.pmt_tof(pmt_ids, evt_pos, backend="direct")
+    table = pu.pmt_tof(pmt_ids, evt_pos, backend="table")
+    assert np.array_equal(direct, table)
+    assert np.array_equal(pu.pmt_tof(pmt_ids, evt_pos), direct)
+    assert pu.pmt_tof(int(pmt_ids[0]), evt_pos) == direct[0]
+
+
+def test_pmt_tof_center():
+    # From the center the light crosses R_S of LS and R_PMT - R_S of water
+    tof = pu.pmt_tof([0, 100], (0, 0, 0))
+    assert np.allclose(tof, (pu.R_S * pu.N_LS + (pu.R_PMT - pu.R_S) * pu.N_H2O) / 300)
+
+
+def test_pmt_tofs():
+    pmt_ids = np.r_[0:40, 100:120]
+    tofs = pu.pmt_tofs(pmt_ids, EVT_POSS, max_mem=2**10)  # several chunks
+    for evt_pos, tof in zip(EVT_POSS, tofs):
+        assert np.allclose(tof, pu.pmt_tof(pmt_ids, evt_pos, backend="direct"))
+    assert np.allclose(pu.pmt_tofs(pmt_ids, EVT_POSS, dtype=np.float32), tofs, atol=1e-3)
+
+
+def test_pmt_tof_negative_ids():
+    with pytest.raises(AssertionError):
+        pu.pmt_tof([0, -1], (0, 0, 0))
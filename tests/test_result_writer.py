@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.result_writer import ResultWriter, load_results, get_summary_lines, write_summary
+
+
+RECORDS = {
+    "mu-_1/detsim/lpmt": {
+        "hit_times": np.linspace(0, 100, 1000, dtype=np.float32),
+        "poss": np.arange(30, dtype=float).reshape(10, 3),
+        "evt_num": np.asarray(10),
+        "errors": np.asarray(["entry=3: no peaks"]),
+    },
+    "mu-_1/detsim/spmt": {
+        "hit_times": np.zeros(0, dtype=np.float32),
+        "file_path": np.asarray("det_user.root"),
+    },
+}
+
+
+def _write(file_pth):
+    with ResultWriter(file_pth) as writer:
+        for record_nm, arrs in RECORDS.items():
+            writer.write(record_nm, **arrs)
+
+
+def test_round_trip(tmp_path):
+    file_pth = str(tmp_path / "results.npz")
+    _write(file_pth)
+    results = load_results(file_pth)
+    assert list(results) == list(RECORDS)
+    for record_nm, arrs in RECORDS.items():
+        assert list(results[record_nm]) == list(arrs)
+        for nm, arr in arrs.items():
+            assert results[record_nm][nm].dtype == arr.dtype and np.array_equal(results[record_nm][nm], arr)
+
+
+def test_duplicate_record(tmp_path):
+    with pytest.raises(AssertionError):
+        with ResultWriter(str(tmp_path / "results.npz")) as writer:
+            writer.write("a", x=[1])
+            writer.write("a", x=[2])
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("max_num", [1, 5, 10, 2000])
+def test_write_summary(tmp_path, max_num):
+    # The streamed summary is identical to the summary of the fully loaded results
+    file_pth = str(tmp_path / "results.npz")
+    _write(file_pth)
+    write_summary(file_pth, str(tmp_path / "summary.txt"), max_num=max_num)
+    with open(tmp_path / "summary.txt", "r") as f:
+        summary = f.read()
+    assert summary == "".join(f"{line}\n" for line in get_summary_lines(load_results(file_pth), max_num=max_num))
+    assert "(1000 values)" in summary or max_num >= 1000
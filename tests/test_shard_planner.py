@@ -0,0 +1,65 @@
+import pytest
+
+from utils import shard_planner as sp
+
+
+PLAN_PARS = dict(evt_num=1050, evts_per_job=100, particles=["mu-", "e-"], positions=[["0", "0", "0"]], momentums=[["1000"], ["2000"]])
+
+
+def test_draw_seeds():
+    seeds = sp.draw_seeds(100000, base_seed=1)
+    assert len(set(seeds)) == len(seeds)
+    assert min(seeds) >= 1 and max(seeds) <= sp.MAX_SEED
+    assert seeds == sp.draw_seeds(100000, base_seed=1)
+    assert seeds[:100] != sp.draw_seeds(100, base_seed=2)
+
+
+def test_plan_shards():
+    manifest = sp.plan_shards(**PLAN_PARS, base_seed=42, start_evtid=500)
+    jobs = manifest["jobs"]
+    assert len(jobs) == 4 * 11  # 10 jobs of 100 events and one of 50 per configuration
+    assert [job["job"] for job in jobs] == list(range(len(jobs)))
+    assert len({job["seed"] for job in jobs}) == len(jobs)
+    ### Contiguous, disjoint event id ranges
+    evtid = 500
+    for job in jobs:
+        assert job["start_evtid"] == evtid
+        evtid += job["evtmax"]
+    assert evtid == 500 + 4 * 1050
+    for config_jobs in [jobs[i:i+11] for i in range(0, len(jobs), 11)]:
+        assert [job["evtmax"] for job in config_jobs] == [100] * 10 + [50]
+        assert [job["i"] for job in config_jobs] == list(range(1, 12))
+        assert len({(job["particles"], tuple(job["momentum"])) for job in config_jobs}) == 1
+    assert manifest == sp.plan_shards(**PLAN_PARS, base_seed=42, start_evtid=500)
+
+
+def test_check_manifest():
+    manifest = sp.plan_shards(**PLAN_PARS, base_seed=42)
+    sp.check_manifest(manifest, **PLAN_PARS, base_seed=42)
+    with pytest.raises(ValueError, match="base_seed"):
+        sp.check_manifest(manifest, **PLAN_PARS, base_seed=43)
+    with pytest.raises(ValueError, match="momentums"):
+        sp.check_manifest(manifest, **{**PLAN_PARS, "momentums": [["1000"]]}, base_seed=42)
+    with pytest.raises(ValueError, match="evts_per_job"):
+        sp.check_manifest(manifest, **{**PLAN_PARS, "evts_per_job": 50}, base_seed=42)
+
+
+def test_save_load_manifest(tmp_path):
+    manifest = sp.plan_shards(**PLAN_PARS, base_seed=42)
+    manifest_pth = str(tmp_path / "detsim_manifest.json")
+    sp.save_manifest(manifest, manifest_pth)
+    loaded_manifest = sp.load_manifest(manifest_pth)
+    assert loaded_manifest == manifest
+    sp.check_manifest(loaded_manifest, **PLAN_PARS, base_seed=42)
+    ### Manifests of another version are refused
+    sp.save_manifest({**manifest, "version": sp.MANIFEST_VERSION - 1}, manifest_pth)
+    with pytest.raises(AssertionError):
+        sp.load_manifest(manifest_pth)
+
+
+def test_get_job_cmd():
+    job = sp.plan_shards(**PLAN_PARS, base_seed=42)["jobs"][3]
+    cmd, output_path, user_output_path = sp.get_job_cmd("/tut", "/out", job)
+    for arg, val in [("--evtmax", job["evtmax"]), ("--seed", job["seed"]), ("--start-evtid", job["start_evtid"])]:
+        assert cmd[cmd.index(arg) + 1] == str(val)
+    assert output_path.startswith("/out/") and f"{job['seed']}seed" in output_path
@@ -0,0 +1,70 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from utils import stages as st
+
+
+def _setup(tmp_path):
+    input_path = tmp_path / "mu-_1_det.root"
+    input_path.write_text("input")
+    output_paths = [str(tmp_path / "mu-_1_det2elec.root"), str(tmp_path / "mu-_1_det2elec_user.root")]
+    # The command writes both outputs and counts its runs
+    code = f"import sys; [open(p, 'w').write('out') for p in sys.argv[1:]]; open({str(tmp_path / 'runs')!r}, 'a').write('x')"
+    cmd = [sys.executable, "-c", code, *output_paths]
+    return str(input_path), output_paths, cmd
+
+
+def _get_run_num(tmp_path):
+    return len((tmp_path / "runs").read_text()) if (tmp_path / "runs").exists() else 0
+
+
+def test_get_output_pths():
+    output_path, user_output_path = st.get_output_pths("/sim/detsim/mu-_1_det.root", "/sim/det2elec", "det2elec")
+    assert output_path == "/sim/det2elec/mu-_1_det2elec.root"
+    assert user_output_path == "/sim/det2elec/mu-_1_det2elec_user.root"
+
+
+def test_run_stage(tmp_path):
+    input_path, output_paths, cmd = _setup(tmp_path)
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    assert st.run_stage(cmd, input_path, output_paths)
+    assert st.is_up_to_date(cmd, input_path, output_paths)
+    assert not st.run_stage(cmd, input_path, output_paths)
+    assert st.run_stage(cmd, input_path, output_paths, force=True)
+    assert _get_run_num(tmp_path) == 2
+
+
+def test_not_up_to_date(tmp_path):
+    input_path, output_paths, cmd = _setup(tmp_path)
+    st.run_stage(cmd, input_path, output_paths)
+    ### Other command
+    assert not st.is_up_to_date([*cmd, "--evtmax", "2"], input_path, output_paths)
+    ### Missing output or stamp
+    os.remove(f"{output_paths[1]}{st.STAMP_EXT}")
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    st.run_stage(cmd, input_path, output_paths)
+    os.remove(output_paths[0])
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    st.run_stage(cmd, input_path, output_paths)
+    ### Changed input
+    with open(input_path, "a") as f:
+        f.write(" changed")
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    ### Missing input
+    os.remove(input_path)
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    assert _get_run_num(tmp_path) == 3
+
+
+def test_failed_stage(tmp_path):
+    input_path, output_paths, cmd = _setup(tmp_path)
+    st.run_stage(cmd, input_path, output_paths)
+    fail_cmd = [sys.executable, "-c", "raise SystemExit(1)"]
+    with pytest.raises(subprocess.CalledProcessError):
+        st.run_stage(fail_cmd, input_path, output_paths)
+    # The stamps of the old outputs are removed before the run, so the stage isn't taken as up to date
+    assert not st.is_up_to_date(cmd, input_path, output_paths)
+    assert not st.is_up_to_date(fail_cmd, input_path, output_paths)
@@ -23,9 +23,30 @@ class Hist:
         self.bin_num = bin_num
         self.min = min
         self.max = max
+        # Empty histogram (can be saved and plotted before anything is added)
+        self.vals = np.zeros(bin_num, dtype=np.int64)
+        self.bin_edges = np.linspace(min, max, bin_num + 1)
     
     def fill(self, vals):
         self.vals, self.bin_edges = np.histogram(vals, bins=self.bin_num, range=(self.min, self.max))
+
+    def add(self, vals):
+        add_vals, self.bin_edges = np.histogram(vals, bins=self.bin_num, range=(self.min, self.max))
+        self.vals = self.vals + add_vals
+    
+    def save(self, file_pth, **meta):
+        # Small sidecar file (bins and values only), allows replotting without the hit data
+        meta_arrs = {f"meta_{nm}": np.asarray(val) for nm, val in meta.items()}
+        np.savez(file_pth, vals=self.vals, bin_edges=self.bin_edges, bin_num=self.bin_num, min=self.min, max=self.max, **meta_arrs)
+    
+    @classmethod
+    def load(cls, file_pth):
+        hist = cls()
+        with np.load(file_pth, allow_pickle=False) as npz_file:
+            hist.set_bins(int(npz_file["bin_num"]), npz_file["min"].item(), npz_file["max"].item())
+            hist.vals, hist.bin_edges = npz_file["vals"], npz_file["bin_edges"]
+            hist.meta = {key[5:]: npz_file[key].item() if npz_file[key].ndim == 0 else npz_file[key] for key in npz_file.files if key.startswith("meta_")}
+        return hist
     
     def normalize(self, factor=1):
         integ = self.get_integ()
@@ -76,7 +97,12 @@ class Hist:
         val = self.vals[bin_idx]
         return val
     
-    def plot(self, ax=plt, **kwargs):
+    def plot(self, ax=plt, histtype="bar", **kwargs):
+        if histtype in ["step", "stepfilled"]:
+            # One artist for all bins (much faster to draw and save than one bar per bin), filled as in matplotlib's histtype
+            kwargs.setdefault("fill", histtype == "stepfilled")
+            ax.stairs(self.vals, self.bin_edges, **kwargs)
+            return
         kwargs.setdefault("align", "edge")
         kwargs.setdefault("rasterized", True)
         width = kwargs.get("width", 0.9) if kwargs["align"] == "center" else np.diff(self.bin_edges)
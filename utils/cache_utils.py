@@ -0,0 +1,143 @@
+"""
+Cache utility functions. A cache entry is a directory of .npy files together with a key
+file, which allows the arrays to be memory-mapped on later loads. Extracted hit data is cached
+as hit stores, which are written event by event.
+"""
+
+__all__ = ["get_key", "save_arrs", "load_arrs", "get_cached_hit_stores"]
+
+import os
+import shutil
+import hashlib
+from contextlib import ExitStack
+
+import numpy as np
+
+from .hit_store import HitStoreWriter, HitStore
+
+
+KEY_FNM = "key.txt"
+
+
+def get_key(*file_pths, version=0, **pars):
+    """
+    Returns a cache key from file paths, sizes and modification times.
+    ---
+    Parameters:
+    file_pths (str): The source file paths
+    version (int, optional): The cache format version
+    pars (any, optional): Additional parameters the cached data depends on
+    ---
+    Returns:
+    key (str): The cache key
+    """
+    items = [f"version={version}"]
+    for file_pth in file_pths:
+        stat = os.stat(file_pth)
+        items.append(f"{os.path.abspath(file_pth)}:{stat.st_size}:{stat.st_mtime_ns}")
+    for nm in sorted(pars):
+        items.append(f"{nm}={pars[nm]!r}")
+    key = hashlib.sha1("\n".join(items).encode()).hexdigest()
+    return key
+
+
+def save_arrs(cache_pth, key, **arrs):
+    """
+    Saves arrays to a cache directory. The directory is written under a temporary name and
+    moved into place afterwards, so that concurrent readers never see a partial entry.
+    ---
+    Parameters:
+    cache_pth (str): The cache directory path
+    key (str): The cache key
+    arrs (array-like of any): The arrays to be cached
+    """
+    parent_dir = os.path.dirname(os.path.abspath(cache_pth))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_pth = f"{cache_pth}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_pth, ignore_errors=True)
+    os.makedirs(tmp_pth)
+    for nm, arr in arrs.items():
+        np.save(f"{tmp_pth}/{nm}.npy", np.asarray(arr), allow_pickle=False)
+    with open(f"{tmp_pth}/{KEY_FNM}", "w") as f:
+        f.write(key)
+    ### Replace a stale entry (open memory maps of readers stay valid)
+    old_pth = f"{cache_pth}.old{os.getpid()}"
+    if os.path.isdir(cache_pth):
+        try:
+            os.rename(cache_pth, old_pth)
+        except OSError:
+            pass
+    try:
+        os.rename(tmp_pth, cache_pth)
+    except OSError:
+        # Another process has written the entry in the meantime
+        shutil.rmtree(tmp_pth, ignore_errors=True)
+    shutil.rmtree(old_pth, ignore_errors=True)
+
+
+def load_arrs(cache_pth, key, mmap_mode="r"):
+    """
+    Loads arrays from a cache directory.
+    ---
+    Parameters:
+    cache_pth (str): The cache directory path
+    key (str): The expected cache key
+    mmap_mode (str, optional): The memory-map mode (None to read the arrays into memory)
+    ---
+    Returns:
+    arrs (dict[str, array-like of any] or None): The cached arrays (None if missing or stale)
+    """
+    try:
+        with open(f"{cache_pth}/{KEY_FNM}", "r") as f:
+            if f.read() != key:
+                return None
+        arrs = {}
+        for fnm in os.listdir(cache_pth):
+            if fnm.endswith(".npy"):
+                arrs[fnm[:-4]] = np.load(f"{cache_pth}/{fnm}", mmap_mode=mmap_mode, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    return arrs
+
+
+def _get_src_id(src_pths):
+    """
+    Returns the cache entry name of source files (independent of their content).
+    """
+    return hashlib.sha1("\n".join(os.path.abspath(src_pth) for src_pth in src_pths).encode()).hexdigest()
+
+
+def get_cached_hit_stores(cache_dir, src_pths, write_func, store_nms, opt_hit_arr_nms=(), version=0, **pars):
+    """
+    Returns hit stores written from source files. The extraction appends event by event to the
+    stores, so that only one event is held in memory. The stores are written
+    again if any source file (size, modification time), the version or the parameters have changed.
+    ---
+    Parameters:
+    cache_dir (str): The cache directory
+    src_pths (list[str]): The source file paths
+    write_func (callable): The extraction function, called as write_func(writers, *src_pths, **pars) with
+        a dict of HitStoreWriters (one per store name)
+    store_nms (list[str]): The store names (e.g. the PMT types)
+    opt_hit_arr_nms (list[str], optional): The optional hit arrays of the stores (see HitStoreWriter)
+    version (int, optional): The extraction version (to be increased if write_func changes)
+    pars (any, optional): Additional parameters passed to write_func
+    ---
+    Returns:
+    hit_stores (dict[str, HitStore]): The hit stores (memory-mapped)
+    """
+    src_id = _get_src_id(src_pths)
+    store_pths = {nm: f"{cache_dir}/{src_id}_{nm}.hits" for nm in store_nms}
+    key = get_key(*src_pths, version=version, **pars)
+    try:
+        hit_stores = {nm: HitStore(store_pth) for nm, store_pth in store_pths.items()}
+        if all(hit_store.meta.get("key") == key for hit_store in hit_stores.values()):
+            return hit_stores
+    except (OSError, ValueError, KeyError):
+        pass
+    ### Written event by event, the temporary stores are removed if the extraction fails
+    with ExitStack() as stack:
+        writers = {nm: stack.enter_context(HitStoreWriter(store_pth, opt_hit_arr_nms=opt_hit_arr_nms, key=key)) for nm, store_pth in store_pths.items()}
+        write_func(writers, *src_pths, **pars)
+    hit_stores = {nm: HitStore(store_pth) for nm, store_pth in store_pths.items()}
+    return hit_stores
@@ -6,6 +6,7 @@ assert "WORKSPACE" in os.environ
 
 WS_DIR = os.environ["WORKSPACE"]
 DATA_DIR = f"{WS_DIR}/data"
+CACHE_DIR = f"{WS_DIR}/.cache"
 
 JUNOSW_DIR = os.environ.get("JUNOTOP", None)
 IS_JUNOSW = os.path.isdir(JUNOSW_DIR)
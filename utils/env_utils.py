@@ -0,0 +1,127 @@
+"""
+Environment snapshot functions. The variables a setup script sets (added or changed compared
+to a clean login environment, independent of the calling session) are captured once and cached (keyed on the script path and
+modification time), so that later starts only read the cached variables instead of sourcing the
+script again. Variables of the submitting session (e.g. HOSTNAME, HOME, TMPDIR, SSH_*) are not
+part of the snapshot, so that jobs keep the values of their worker node.
+"""
+
+__all__ = ["SETUP_SCRIPT", "get_env", "load_env", "get_env_sh"]
+
+import os
+import json
+import shlex
+import hashlib
+import subprocess
+
+
+SETUP_SCRIPT = "/storage/gpfs_data/juno/junofs/users/siebert/setupscript.sh"  # Default JUNO setup script
+ENV_CACHE_DIR = f"{os.environ.get('WORKSPACE', os.path.expanduser('~'))}/.cache/env"
+ENV_CACHE_VERSION = 3
+IGNORED_VAR_NMS = ["_", "PWD", "OLDPWD", "SHLVL"]  # Shell variables which are not restored
+ENV_SEP = "__ENV_UTILS_SOURCED__"  # Separates the environment before and after sourcing in the shell output
+CLEAN_PATH = "/usr/local/bin:/usr/bin:/bin"  # PATH of the clean environment in which the setup script is sourced
+
+
+def _get_cache_pth(setup_script):
+    """
+    Returns the cache file path (without extension) of a setup script snapshot.
+    """
+    stat = os.stat(setup_script)
+    items = [f"version={ENV_CACHE_VERSION}", os.path.abspath(setup_script), str(stat.st_size), str(stat.st_mtime_ns)]
+    key = hashlib.sha1("\n".join(items).encode()).hexdigest()
+    return f"{ENV_CACHE_DIR}/env_{key}"
+
+
+def _write_atomic(file_pth, text):
+    """
+    Writes a text file under a temporary name and moves it into place.
+    """
+    tmp_pth = f"{file_pth}.tmp{os.getpid()}"
+    with open(tmp_pth, "w") as f:
+        f.write(text)
+    os.replace(tmp_pth, file_pth)
+
+
+def _parse_env(output):
+    """
+    Parses the output of env -0.
+    """
+    env = {}
+    for item in output.split("\0"):
+        key, sep, value = item.partition("=")
+        if sep and key not in IGNORED_VAR_NMS:
+            env[key] = value
+    return env
+
+
+def _source_env(setup_script):
+    """
+    Sources a setup script in bash in a clean environment (only HOME, USER, LOGNAME and a minimal
+    PATH) and returns the variables it added or changed. The snapshot therefore doesn't depend on
+    what the calling session already has set.
+    """
+    clean_env = {key: os.environ[key] for key in ["HOME", "USER", "LOGNAME"] if key in os.environ}
+    clean_env["PATH"] = CLEAN_PATH
+    cmd = f"env -0 && printf '{ENV_SEP}' && source {shlex.quote(setup_script)} > /dev/null && env -0"
+    output = subprocess.run(cmd, shell=True, executable="/bin/bash", env=clean_env, stdout=subprocess.PIPE, check=True).stdout
+    old_output, _, new_output = output.decode("utf-8").rpartition(ENV_SEP)
+    old_env, new_env = _parse_env(old_output), _parse_env(new_output)
+    env = {key: value for key, value in new_env.items() if old_env.get(key) != value}
+    return env
+
+
+def get_env(setup_script=SETUP_SCRIPT, refresh=False):
+    """
+    Returns the variables a setup script adds or changes (from the cache if available). Note that
+    only the setup script itself is checked for changes, not the scripts it sources.
+    ---
+    Parameters:
+    setup_script (str, optional): The setup script path
+    refresh (bool, optional): Sources the setup script again even if a snapshot is cached
+    ---
+    Returns:
+    env (dict[str, str]): The added or changed environment variables
+    """
+    cache_pth = _get_cache_pth(setup_script)
+    if not refresh:
+        try:
+            with open(f"{cache_pth}.json", "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    env = _source_env(setup_script)
+    os.makedirs(ENV_CACHE_DIR, exist_ok=True)
+    _write_atomic(f"{cache_pth}.json", json.dumps(env))
+    return env
+
+
+def load_env(setup_script=SETUP_SCRIPT, refresh=False):
+    """
+    Loads the variables a setup script adds or changes into os.environ (see get_env).
+    ---
+    Parameters:
+    setup_script (str, optional): The setup script path
+    refresh (bool, optional): Sources the setup script again even if a snapshot is cached
+    """
+    os.environ.update(get_env(setup_script, refresh=refresh))
+
+
+def get_env_sh(setup_script=SETUP_SCRIPT, refresh=False):
+    """
+    Returns the path of a shell file exporting the variables a setup script adds or changes,
+    which can be sourced instead of the setup script (e.g. in job submission files).
+    ---
+    Parameters:
+    setup_script (str, optional): The setup script path
+    refresh (bool, optional): Sources the setup script again even if a snapshot is cached
+    ---
+    Returns:
+    sh_file_pth (str): The export shell file path
+    """
+    sh_file_pth = f"{_get_cache_pth(setup_script)}.sh"
+    if refresh or not os.path.isfile(sh_file_pth):
+        env = get_env(setup_script, refresh=refresh)
+        lines = [f"export {key}={shlex.quote(value)}" for key, value in env.items() if key.isidentifier()]
+        _write_atomic(sh_file_pth, "\n".join(lines) + "\n")
+    return sh_file_pth
@@ -0,0 +1,118 @@
+"""
+Event loader based on the parameter paths. The requested parameters are grouped by file and
+tree, so that each file is opened once and each tree is read once per entry.
+"""
+
+__all__ = ["PhysEvt", "TrigEvt", "get_par_pth", "load_evts"]
+
+from warnings import warn
+
+import numpy as np
+import ROOT as R
+
+from .parameter_paths import PAR_PTHS
+
+
+class PhysEvt:
+
+    def __init__(self, **pars):
+        self.__dict__.update(pars)
+
+
+class TrigEvt:
+
+    def __init__(self, **pars):
+        self.__dict__.update(pars)
+
+
+EVT_CLASSES = {"phys": PhysEvt, "trig": TrigEvt}
+
+
+def get_par_pth(par_nm, sim_part_nm):
+    """
+    Returns the parameter path of a parameter for a simulation stage.
+    ---
+    Parameters:
+    par_nm (str): The parameter name (e.g. hit_times, rec_pos)
+    sim_part_nm (str): The simulation stage (det, elec, calib, rec)
+    ---
+    Returns:
+    par_pth (dict): The parameter path (see PAR_PTHS)
+    """
+    for par_pth in PAR_PTHS:
+        if par_pth["par_nm"] == par_nm and sim_part_nm in par_pth["sim_part_nms"]:
+            return par_pth
+    raise ValueError(f"Parameter {par_nm!r} is not available for simulation stage {sim_part_nm!r}")
+
+
+def _merge_vals(vals):
+    """
+    Merges the values of a parameter read from several trees (e.g. LPMT and SPMT collections).
+    ---
+    Parameters:
+    vals (list[any]): The values per tree
+    ---
+    Returns:
+    val (any): The merged value
+    """
+    if len(vals) == 1:
+        return vals[0]
+    return np.concatenate([np.atleast_1d(val) for val in vals])
+
+
+def load_evts(file_pths, sim_part_nm, par_nms):
+    """
+    Yields events with the requested parameters from the files of a simulation stage.
+    ---
+    Parameters:
+    file_pths (dict[str, str]): The file paths by file type (edm, usr)
+    sim_part_nm (str): The simulation stage (det, elec, calib, rec)
+    par_nms (list[str]): The parameter names
+    ---
+    Yields:
+    evt (PhysEvt or TrigEvt): The event with the requested parameters as attributes (copies, which stay
+        valid after the next event is read)
+    ---
+    Example:
+    >>> for phys_evt in load_evts({"usr": "det_user.root"}, "det", ["pos", "hit_times", "hit_pmt_ids"]):
+    ...     hit_times, hit_pmt_ids = get_hits(phys_evt, pmt_typ="lpmt")
+    """
+    if len(par_nms) == 0:
+        raise ValueError("No parameter names given")
+    par_pths = [get_par_pth(par_nm, sim_part_nm) for par_nm in par_nms]
+    evt_types = {par_pth["evt_type"] for par_pth in par_pths}
+    assert len(evt_types) == 1, "Physical and trigger event parameters can't be loaded together"
+    evt_class = EVT_CLASSES[evt_types.pop()]
+    ### Group parameters by file type and tree
+    get_funcs = {}
+    for par_pth in par_pths:
+        for tree_nm, get_func in par_pth["get_funcs"].items():
+            get_funcs.setdefault((par_pth["file_type"], tree_nm), []).append((par_pth["par_nm"], get_func))
+    ### Open each file and tree once
+    files = {}
+    try:
+        for file_type in {file_type for file_type, _ in get_funcs}:
+            file = R.TFile.Open(file_pths[file_type])
+            if not file or file.IsZombie():
+                raise OSError(f"Can't open {file_pths[file_type]}")
+            files[file_type] = file
+        trees = {}
+        for file_type, tree_nm in get_funcs:
+            tree = files[file_type].Get(tree_nm)
+            if not tree:
+                raise KeyError(f"Tree {tree_nm!r} not found in {file_pths[file_type]}")
+            trees[(file_type, tree_nm)] = tree
+        entry_nums = {tree.GetEntries() for tree in trees.values()}
+        if len(entry_nums) > 1:
+            warn(f"The trees have different entry numbers {sorted(entry_nums)}. Only the common entries are loaded.")
+        ### Read each tree once per entry
+        for entry in range(min(entry_nums)):
+            pars = {}
+            for key, tree in trees.items():
+                tree.GetEntry(entry)
+                for par_nm, get_func in get_funcs[key]:
+                    pars.setdefault(par_nm, []).append(get_func(tree))
+            yield evt_class(**{par_nm: _merge_vals(vals) for par_nm, vals in pars.items()})
+    finally:
+        for file in files.values():
+            file.Close()
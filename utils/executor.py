@@ -0,0 +1,97 @@
+"""
+Local parallel executor for the simulation stage commands. The number of parallel tasks is
+bounded by the number of cores and the available memory, the output of each task is written
+to its own log file.
+"""
+
+__all__ = ["DEFAULT_MEM_PER_TASK", "get_available_mem", "get_worker_num", "run_cmd", "run_tasks"]
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MEM_PER_TASK = 3 * 2**30  # Expected memory of one JUNO simulation/reconstruction process [B]
+
+
+def get_available_mem():
+    """
+    Returns the available memory (MemAvailable of /proc/meminfo).
+    ---
+    Returns:
+    mem (int or None): The available memory [B] (None if unknown)
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_worker_num(mem_per_task=DEFAULT_MEM_PER_TASK, max_worker_num=None):
+    """
+    Returns the number of tasks that can run in parallel on this node.
+    ---
+    Parameters:
+    mem_per_task (int, optional): The expected memory of one task [B]
+    max_worker_num (int, optional): An upper limit (e.g. from the settings)
+    ---
+    Returns:
+    worker_num (int): The number of parallel tasks (at least 1)
+    """
+    worker_num = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    mem = get_available_mem()
+    if mem is not None and mem_per_task:
+        worker_num = min(worker_num, mem // mem_per_task)
+    if max_worker_num is not None:
+        worker_num = min(worker_num, max_worker_num)
+    return max(int(worker_num), 1)
+
+
+def run_cmd(cmd, log_pth=None):
+    """
+    Runs a command and writes its output (stdout and stderr) to a log file.
+    ---
+    Parameters:
+    cmd (list[str]): The command
+    log_pth (str, optional): The log file path (None to keep the output on the terminal)
+    """
+    if log_pth is None:
+        subprocess.run(cmd, check=True)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(log_pth)), exist_ok=True)
+    with open(log_pth, "w") as f:
+        subprocess.run(cmd, check=True, stdout=f, stderr=subprocess.STDOUT)
+
+
+def run_tasks(tasks, worker_num=None, mem_per_task=DEFAULT_MEM_PER_TASK):
+    """
+    Runs tasks in parallel.
+    ---
+    Parameters:
+    tasks (list[tuple[str, callable]]): The task names and functions (e.g. partial(run_cmd, cmd, log_pth))
+    worker_num (int, optional): The maximum number of parallel tasks (default: see get_worker_num)
+    mem_per_task (int, optional): The expected memory of one task [B]
+    ---
+    Returns:
+    errors (dict[str, Exception or None]): The error of each task (None if successful) in task order
+    ---
+    Example:
+    >>> errors = run_tasks([(input_filename, partial(run_cmd, cmd, log_pth)) for ...])
+    >>> error_count = sum(e is not None for e in errors.values())
+    """
+    worker_num = get_worker_num(mem_per_task, max_worker_num=worker_num)
+    print(f"Running {len(tasks)} tasks with {worker_num} workers")
+    errors = {}
+    with ThreadPoolExecutor(max_workers=worker_num) as executor:
+        futures = [(nm, executor.submit(func)) for nm, func in tasks]
+        for nm, future in futures:
+            try:
+                future.result()
+                errors[nm] = None
+            except Exception as e:
+                errors[nm] = e
+    return errors
@@ -0,0 +1,120 @@
+"""
+File transfer functions for the conversion of simulation outputs into datasets. A file is linked
+(hardlink, reflink or symlink) where the filesystem allows it and copied otherwise. Every transfer
+is written under a temporary name, verified (size and identity or checksum) and moved into place.
+"""
+
+__all__ = ["TRANSFER_MODES", "get_checksum", "transfer_file"]
+
+import os
+import shutil
+import fcntl
+import hashlib
+
+
+TRANSFER_MODES = ["hardlink", "reflink", "symlink", "copy"]  # Supported transfer modes
+FICLONE = 0x40049409  # Linux ioctl to clone the extents of a file (btrfs, XFS, ...)
+CHUNK_SIZE = 16 * 2**20  # Read size of the checksum [B]
+
+
+def get_checksum(file_pth):
+    """
+    Returns the checksum (sha1) of a file.
+    ---
+    Parameters:
+    file_pth (str): The file path
+    ---
+    Returns:
+    checksum (str): The hex digest
+    """
+    h = hashlib.sha1()
+    with open(file_pth, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _reflink(src, dst):
+    """
+    Creates a copy-on-write clone of a file (raises OSError if not supported by the filesystem).
+    """
+    with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+        try:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        except OSError:
+            f_dst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _transfer(src, dst, mode):
+    """
+    Transfers a file with one mode.
+    """
+    if mode == "hardlink":
+        os.link(src, dst)
+    elif mode == "reflink":
+        _reflink(src, dst)
+    elif mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    elif mode == "copy":
+        shutil.copy2(src, dst)
+    else:
+        raise ValueError(f"Unknown transfer mode {mode} (supported: {TRANSFER_MODES})")
+
+
+def _verify(src, dst, mode):
+    """
+    Verifies a transfer. Links must point to the source file, the data of clones and copies must
+    have the same checksum.
+    """
+    if os.path.getsize(src) != os.path.getsize(dst):
+        raise OSError(f"Size mismatch after {mode} of {src} to {dst}")
+    if mode in ["hardlink", "symlink"]:
+        if not os.path.samefile(src, dst):
+            raise OSError(f"{dst} is not a {mode} to {src}")
+    elif get_checksum(src) != get_checksum(dst):
+        raise OSError(f"Checksum mismatch after {mode} of {src} to {dst}")
+
+
+def transfer_file(src, dst, modes=("hardlink", "reflink", "copy"), verify=True):
+    """
+    Transfers a file with the first mode the filesystem allows. An existing destination is replaced.
+    ---
+    Parameters:
+    src (str): The source file path
+    dst (str): The destination file path
+    modes (list[str], optional): The transfer modes in the order they are tried (see TRANSFER_MODES)
+    verify (bool, optional): Verifies the transfer (size and identity or checksum)
+    ---
+    Returns:
+    mode (str): The transfer mode used
+    ---
+    Example:
+    >>> transfer_file("detsim/mu-_1_..._det.root", "det/det_edm_0.root", modes=["hardlink", "copy"])
+    'hardlink'
+    """
+    tmp_dst = f"{dst}.tmp{os.getpid()}"
+    errors = []
+    for mode in modes:
+        if os.path.lexists(tmp_dst):
+            os.remove(tmp_dst)
+        try:
+            _transfer(src, tmp_dst, mode)
+        except OSError as e:  # E.g. EXDEV (other filesystem), EPERM or EOPNOTSUPP, the next mode is tried
+            errors.append(f"{mode}: {e}")
+            continue
+        try:
+            if verify:
+                _verify(src, tmp_dst, mode)
+            os.replace(tmp_dst, dst)
+        except OSError:
+            if os.path.lexists(tmp_dst):
+                os.remove(tmp_dst)
+            raise
+        return mode
+    # A failed transfer (e.g. a copy interrupted by ENOSPC) can leave a partial temporary file
+    if os.path.lexists(tmp_dst):
+        os.remove(tmp_dst)
+    raise OSError(f"Transfer of {src} to {dst} failed ({'; '.join(errors)})")
@@ -0,0 +1,176 @@
+"""
+Ragged hit store. The hits of all events are stored as flat arrays (one raw file per array)
+together with int64 event offsets, so that the hits of any event can be read as zero-copy
+slices of memory maps.
+"""
+
+__all__ = ["HIT_ARR_DTYPES", "HitStoreWriter", "HitStore", "write_hit_store"]
+
+import os
+import json
+import shutil
+
+import numpy as np
+
+
+HIT_ARR_DTYPES = {          # Hit array names and their stored data types
+    "hit_times": np.float32,
+    "hit_pmt_ids": np.int32,
+    "hit_charges": np.float32,
+    "hit_track_ids": np.int32,
+}
+OPT_HIT_ARR_NMS = ["hit_charges", "hit_track_ids"]  # Hit arrays which are only stored if given
+OFFSETS_FNM = "offsets.i64"
+POSS_FNM = "poss.f64"
+META_FNM = "meta.json"
+
+
+class HitStoreWriter:
+    """
+    Writes a hit store event by event. The arrays are appended to the files directly, so that
+    only one event is held in memory. The store is written under a temporary name and moved into
+    place on close.
+    ---
+    Example:
+    >>> with HitStoreWriter("muons.hits", opt_hit_arr_nms=["hit_track_ids"], src="det_user.root") as writer:
+    ...     for phys_evt in phys_evts:
+    ...         writer.append(phys_evt.hit_times, phys_evt.hit_pmt_ids, hit_track_ids=phys_evt.hit_track_ids, pos=phys_evt.pos)
+    """
+
+    def __init__(self, store_pth, opt_hit_arr_nms=(), **meta):
+        assert all(nm in OPT_HIT_ARR_NMS for nm in opt_hit_arr_nms)
+        self.store_pth = store_pth
+        self.meta = meta  # Additional JSON serializable metadata (e.g. a cache key), see HitStore.meta
+        self.tmp_pth = f"{store_pth}.tmp{os.getpid()}"
+        self.hit_arr_nms = ["hit_times", "hit_pmt_ids", *opt_hit_arr_nms]
+        shutil.rmtree(self.tmp_pth, ignore_errors=True)
+        os.makedirs(self.tmp_pth)
+        self.files = {nm: open(f"{self.tmp_pth}/{nm}.bin", "wb") for nm in self.hit_arr_nms}
+        self.offsets_file = open(f"{self.tmp_pth}/{OFFSETS_FNM}", "wb")
+        self.poss_file = open(f"{self.tmp_pth}/{POSS_FNM}", "wb")
+        self.offsets_file.write(np.zeros(1, dtype=np.int64).tobytes())
+        self.hit_num = 0
+        self.evt_num = 0
+
+    def append(self, hit_times, hit_pmt_ids, pos=(np.nan, np.nan, np.nan), **opt_hit_arrs):
+        """
+        Appends the hits of one event.
+        ---
+        Parameters:
+        hit_times (array-like of float): The hit times
+        hit_pmt_ids (array-like of int): The hit PMT ids
+        pos (tuple[float], optional): The event position (x, y, z)
+        opt_hit_arrs (array-like of any, optional): The optional hit arrays of the store (hit_charges, hit_track_ids)
+        """
+        hit_arrs = {"hit_times": hit_times, "hit_pmt_ids": hit_pmt_ids, **opt_hit_arrs}
+        assert set(hit_arrs) == set(self.hit_arr_nms), f"Expected the hit arrays {self.hit_arr_nms}"
+        hit_arrs = {nm: np.asarray(arr, dtype=HIT_ARR_DTYPES[nm]) for nm, arr in hit_arrs.items()}
+        hit_num = len(hit_arrs["hit_times"])
+        assert all(len(arr) == hit_num for arr in hit_arrs.values())
+        for nm, arr in hit_arrs.items():
+            self.files[nm].write(arr.tobytes())
+        self.hit_num += hit_num
+        self.evt_num += 1
+        self.offsets_file.write(np.asarray([self.hit_num], dtype=np.int64).tobytes())
+        self.poss_file.write(np.asarray(pos, dtype=np.float64).reshape(3).tobytes())
+
+    def close(self):
+        """
+        Finishes the store and moves it into place.
+        """
+        for file in [*self.files.values(), self.offsets_file, self.poss_file]:
+            file.close()
+        meta = {"hit_arr_nms": self.hit_arr_nms, "hit_num": self.hit_num, "evt_num": self.evt_num, "meta": self.meta}
+        with open(f"{self.tmp_pth}/{META_FNM}", "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.store_pth, ignore_errors=True)
+        os.rename(self.tmp_pth, self.store_pth)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for file in [*self.files.values(), self.offsets_file, self.poss_file]:
+                file.close()
+            shutil.rmtree(self.tmp_pth, ignore_errors=True)
+
+
+class HitStore:
+    """
+    Reads a hit store with memory maps. Events are returned as dicts of zero-copy slices, which
+    can be passed to hit_time_utils.select_pmts, correct_tof and align directly.
+    ---
+    Example:
+    >>> hit_store = HitStore("muons.hits")
+    >>> evt = hit_store[42]
+    >>> hit_times, hit_pmt_ids = htu.select_pmts(evt["hit_times"], evt["hit_pmt_ids"], pmt_typ="lpmt")
+    >>> hit_times = htu.correct_tof(hit_times, hit_pmt_ids, evt["pos"])
+    """
+
+    def __init__(self, store_pth):
+        self.store_pth = store_pth
+        with open(f"{store_pth}/{META_FNM}", "r") as f:
+            meta = json.load(f)
+        self.hit_arr_nms = meta["hit_arr_nms"]
+        self.hit_num = meta["hit_num"]
+        self.evt_num = meta["evt_num"]
+        self.meta = meta.get("meta", {})
+        self.offsets = self._memmap(OFFSETS_FNM, np.int64, (self.evt_num + 1,))
+        self.poss = self._memmap(POSS_FNM, np.float64, (self.evt_num, 3))
+        self.hit_arrs = {nm: self._memmap(f"{nm}.bin", HIT_ARR_DTYPES[nm], (self.hit_num,)) for nm in self.hit_arr_nms}
+
+    def _memmap(self, fnm, dtype, shape):
+        """
+        Returns a read-only memory map of a store file (an empty array for empty files).
+        """
+        if np.prod(shape) == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(f"{self.store_pth}/{fnm}", dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self):
+        return self.evt_num
+
+    def __getitem__(self, evt_idx):
+        """
+        Returns the hits of an event.
+        ---
+        Parameters:
+        evt_idx (int): The event index
+        ---
+        Returns:
+        evt (dict[str, any]): The hit arrays (zero-copy slices) and the event position (pos)
+        """
+        if evt_idx < 0:
+            evt_idx += self.evt_num
+        if not 0 <= evt_idx < self.evt_num:
+            raise IndexError(f"Event index {evt_idx} out of range for {self.evt_num} events")
+        start, stop = self.offsets[evt_idx], self.offsets[evt_idx+1]
+        evt = {nm: arr[start:stop] for nm, arr in self.hit_arrs.items()}
+        evt["pos"] = tuple(self.poss[evt_idx].tolist())
+        return evt
+
+    def __iter__(self):
+        for evt_idx in range(self.evt_num):
+            yield self[evt_idx]
+
+
+def write_hit_store(store_pth, evts, opt_hit_arr_nms=()):
+    """
+    Writes events to a hit store.
+    ---
+    Parameters:
+    store_pth (str): The hit store directory path
+    evts (iterable[dict[str, any]]): The events with the hit arrays (hit_times, hit_pmt_ids and the optional arrays) and optionally pos
+    opt_hit_arr_nms (list[str], optional): The optional hit arrays to be stored (hit_charges, hit_track_ids)
+    ---
+    Returns:
+    hit_store (HitStore): The written hit store
+    """
+    with HitStoreWriter(store_pth, opt_hit_arr_nms=opt_hit_arr_nms) as writer:
+        for evt in evts:
+            writer.append(**{nm: evt[nm] for nm in [*writer.hit_arr_nms, "pos"] if nm in evt})
+    hit_store = HitStore(store_pth)
+    return hit_store
@@ -2,18 +2,54 @@
 Hit time utility functions.
 """
 
-__all__ = ["select_pmts", "select_time", "correct_tof", "get_align_shift", "align", "shift", "remove_nan", "get_hits", "get_rec_hits"]
+__all__ = ["select_pmts", "select_time", "correct_tof", "get_align_shift", "get_align_shifts", "align", "align_many", "shift", "remove_nan", "get_hits", "get_rec_hits"]
 
 from collections.abc import Iterable
 from warnings import warn
 
 import numpy as np
+from scipy.signal import savgol_filter, savgol_coeffs, find_peaks, peak_prominences
+from scipy.ndimage import convolve1d
 
-#from .tools import Hist
-from .ana_tools import Hist 
 from . import pmt_utils as pu
 
 
+SAVGOL_WINDOW_LENGTH = 5  # Savitzky-Golay window length of the alignment histogram smoothing
+SAVGOL_POLYORDER = 3      # Savitzky-Golay polynomial order of the alignment histogram smoothing
+# Precomputed Savitzky-Golay filter (as in savgol_filter with mode="interp"): the convolution coefficients
+# and the linear map of the first/last window onto the edge values fitted by a polynomial
+SAVGOL_COEFFS = savgol_coeffs(SAVGOL_WINDOW_LENGTH, SAVGOL_POLYORDER)
+SAVGOL_EDGE_COEFFS = savgol_filter(np.eye(SAVGOL_WINDOW_LENGTH), SAVGOL_WINDOW_LENGTH, SAVGOL_POLYORDER, axis=0)
+
+
+def _get_pmt_mask(hit_pmt_ids, pmt_typ=None, pmt_mfr=None):
+    """
+    Returns the mask of hits on CD PMTs of given type or manufacturer.
+    ---
+    Parameters:
+    hit_pmt_ids (array-like of int): The hit PMT ids
+    pmt_typ (str, optional): The PMT type to be filtered (lpmt, spmt)
+    pmt_mfr (str, optional): The PMT manufacturers to be filtered (Hamamatsu, HighQENNVT, HZC)
+    ---
+    Returns:
+    mask (array-like of bool): The hit mask
+    """
+    hit_pmt_ids = np.asarray(hit_pmt_ids)
+    mask = (hit_pmt_ids >= 0) & (hit_pmt_ids < 50000)
+    if pmt_typ is None and pmt_mfr is None:
+        return mask
+    ### Ids outside the PMT tables are dropped (not mapped to another PMT)
+    mask &= hit_pmt_ids <= pu.max_pmt_id
+    idcs = hit_pmt_ids[mask].astype(np.intp, copy=False)
+    sub_mask = np.ones(len(idcs), dtype=bool)
+    if pmt_typ is not None:
+        sub_mask &= pu.pmt_typ_arr[idcs] == pu.pmt_typ_code(pmt_typ)
+    if pmt_mfr is not None:
+        sub_mask &= pu.pmt_mfr_arr[idcs] == pu.pmt_mfr_code(pmt_mfr)
+    mask[mask] = sub_mask
+    return mask
+
+
 def select_pmts(hit_times, hit_pmt_ids, *add_hit_arrs, pmt_typ=None, pmt_mfr=None):
     """
     Filters hit time data based on PMT type or manufacturer.
@@ -32,20 +68,10 @@ def select_pmts(hit_times, hit_pmt_ids, *add_hit_arrs, pmt_typ=None, pmt_mfr=Non
     """
     hit_times, hit_pmt_ids, *add_hit_arrs = map(np.asarray, [hit_times, hit_pmt_ids, *add_hit_arrs])
     assert all(len(arr) == len(hit_times) for arr in [hit_pmt_ids, *add_hit_arrs])
-    mask = hit_pmt_ids < 50000
+    mask = _get_pmt_mask(hit_pmt_ids, pmt_typ=pmt_typ, pmt_mfr=pmt_mfr)
     hit_times = hit_times[mask]
     hit_pmt_ids = hit_pmt_ids[mask]
     add_hit_arrs = [arr[mask] for arr in add_hit_arrs]
-    if pmt_typ is not None:
-        mask = pu.pmt_typ(hit_pmt_ids) == pmt_typ
-        hit_times = hit_times[mask]
-        hit_pmt_ids = hit_pmt_ids[mask]
-        add_hit_arrs = [arr[mask] for arr in add_hit_arrs]
-    if pmt_mfr is not None:
-        mask = pu.pmt_mfr(hit_pmt_ids) == pmt_mfr
-        hit_times = hit_times[mask]
-        hit_pmt_ids = hit_pmt_ids[mask]
-        add_hit_arrs = [arr[mask] for arr in add_hit_arrs]
     return hit_times, hit_pmt_ids, *add_hit_arrs
 
 
@@ -73,7 +99,8 @@ def select_time(hit_times, *add_hit_arrs, t_min=None, t_max=None):
 
 def correct_tof(hit_times, hit_pmt_ids, evt_pos):
     """
-    Applies TOF correction on hit times for a given event position.
+    Applies TOF correction on hit times for a given event position. The input is not modified
+    (e.g. read-only slices of a HitStore can be passed).
     ---
     Parameters:
     hit_times (array-like of int): The uncorrected hit times
@@ -86,11 +113,150 @@ def correct_tof(hit_times, hit_pmt_ids, evt_pos):
     hit_times, hit_pmt_ids = map(np.asarray, [hit_times, hit_pmt_ids])
     assert len(hit_times) == len(hit_pmt_ids)
     tof = pu.pmt_tof(hit_pmt_ids, evt_pos)
-    hit_times -= tof
+    hit_times = hit_times - tof
     return hit_times
 
 
-def get_align_shift(hit_times, prominence, max_ratio=0.1, offset=2):
+def _get_hist_vals(hit_times, x_min, x_max):
+    """
+    Returns the hit time histogram with 1 ns bins between x_min and x_max (binned as in Hist.fill).
+    ---
+    Parameters:
+    hit_times (array-like of float): The hit times
+    x_min (int): The histogram minimum
+    x_max (int): The histogram maximum
+    ---
+    Returns:
+    vals (array-like of int): The bin counts
+    """
+    bin_num = max(x_max - x_min, 1)
+    floor_min, floor_max = int(np.floor(hit_times.min())), int(np.floor(hit_times.max()))
+    if floor_max - floor_min > 4 * bin_num + 1024:
+        # Far outliers (x range limited to +-100000 ns), only the hits in the range are binned
+        hit_times = hit_times[(hit_times >= x_min) & (hit_times <= x_min + bin_num)]
+        bin_idcs = (np.floor(hit_times) - x_min).astype(np.intp)
+        bin_idcs[bin_idcs == bin_num] -= 1
+        vals = np.bincount(bin_idcs, minlength=bin_num)
+        return vals
+    ### Count all hits by their floored time and cut out the range (without copying the hits in range)
+    counts = np.bincount(np.floor(hit_times).astype(np.intp) - floor_min, minlength=x_min + bin_num - floor_min + 1)
+    vals = counts[x_min-floor_min:x_min-floor_min+bin_num].copy()
+    # The upper edge is included in the last bin, the other hits of that floored time are outside
+    if floor_max >= x_min + bin_num:
+        vals[-1] += np.count_nonzero(hit_times == x_min + bin_num)
+    return vals
+
+
+def _get_x_range(hit_times):
+    """
+    Returns the histogram range of hit times used for alignment.
+    ---
+    Parameters:
+    hit_times (array-like of float): The hit times
+    ---
+    Returns:
+    x_min, x_max (int): The histogram minimum and maximum
+    """
+    x_min, x_max = max(int(hit_times.min()), -100000), min(int(hit_times.max()), 100000)
+    return x_min, x_max
+
+
+def _smooth_vals(vals, window_length=SAVGOL_WINDOW_LENGTH, polyorder=SAVGOL_POLYORDER):
+    """
+    Smooths histogram values (as in Hist.smooth).
+    ---
+    Parameters:
+    vals (array-like of float): The histogram values
+    window_length (int): The Savitzky-Golay window length
+    polyorder (int): The Savitzky-Golay polynomial order
+    ---
+    Returns:
+    vals (array-like of float): The smoothed histogram values
+    """
+    if (window_length, polyorder) == (SAVGOL_WINDOW_LENGTH, SAVGOL_POLYORDER) and vals.shape[-1] >= window_length:
+        # Precomputed filter, avoids fitting the edge polynomials on every call
+        raw_vals = np.asarray(vals, dtype=float)
+        vals = convolve1d(raw_vals, SAVGOL_COEFFS, axis=-1, mode="constant")
+        half_window_length = window_length // 2
+        vals[..., :half_window_length] = raw_vals[..., :window_length] @ SAVGOL_EDGE_COEFFS[:half_window_length].T
+        vals[..., -half_window_length:] = raw_vals[..., -window_length:] @ SAVGOL_EDGE_COEFFS[-half_window_length:].T
+    else:
+        vals = savgol_filter(vals, window_length=window_length, polyorder=polyorder, axis=-1, mode="interp" if vals.shape[-1] >= window_length else "nearest")
+    vals = np.ceil(vals)
+    vals[vals < 0] = 0
+    return vals
+
+
+def _get_align_shift_from_vals(vals, x_min, prominence, max_ratio, offset, coarse_bin_width):
+    """
+    Calculates the align shift from a smoothed hit time histogram (see get_align_shift).
+    ---
+    Parameters:
+    vals (array-like of float): The smoothed histogram values (1 ns bins)
+    x_min (int): The histogram minimum
+    prominence (float): The peak prominence
+    max_ratio (float): The alignement maximum ratio
+    offset (float): The alignement offset
+    coarse_bin_width (int): The bin width [ns] of the coarse histogram limiting the peak search
+    ---
+    Returns:
+    align_shift (float): The align shift
+    """
+    bin_idx = _get_first_peak_bin_idx(vals, prominence, coarse_bin_width)
+    if bin_idx is None:
+        warn("No peaks found. The maximum is used for alignment.")
+        bin_idx = np.argmax(vals)
+    ### Go back to the last bin below the maximum ratio
+    below_bin_idcs = np.flatnonzero(vals[:bin_idx+1] < max_ratio*vals[bin_idx])
+    bin_idx = below_bin_idcs[-1] if len(below_bin_idcs) > 0 else 0
+    x_val = float(x_min + bin_idx)
+    shift = - x_val + offset
+    return shift
+
+
+def _get_first_peak_bin_idx(vals, prominence, coarse_bin_width=10):
+    """
+    Returns the index of the first peak with given prominence. Local maxima are only
+    evaluated up to the first peak of a coarse histogram (the search window is extended if no
+    peak is found there), while their prominences are calculated on the full histogram. The
+    result is thus identical to a search over all local maxima.
+    ---
+    Parameters:
+    vals (array-like of float): The (smoothed) histogram values
+    prominence (float): The peak prominence
+    coarse_bin_width (int): The coarse histogram bin width (in bins)
+    ---
+    Returns:
+    bin_idx (int or None): The peak bin index (None if no peak is found)
+    """
+    bin_num = len(vals)
+    win_max = bin_num
+    if coarse_bin_width > 1 and bin_num > 4 * coarse_bin_width:
+        coarse_bin_num = bin_num // coarse_bin_width
+        coarse_vals = vals[:coarse_bin_num*coarse_bin_width].reshape(coarse_bin_num, coarse_bin_width).mean(axis=1)
+        coarse_peak_bin_idcs, _ = find_peaks(coarse_vals, prominence=prominence)
+        if len(coarse_peak_bin_idcs) > 0:
+            win_max = (coarse_peak_bin_idcs[0] + 2) * coarse_bin_width
+    win_min = 0
+    while True:
+        win_max = min(win_max, bin_num)
+        local_max_bin_idcs, _ = find_peaks(vals[win_min:win_max])
+        local_max_bin_idcs += win_min
+        if len(local_max_bin_idcs) > 0:
+            prominences, _, _ = peak_prominences(vals, local_max_bin_idcs)
+            peak_mask = prominences >= prominence
+            if np.any(peak_mask):
+                return local_max_bin_idcs[np.argmax(peak_mask)]
+        if win_max >= bin_num:
+            return None
+        # Start the next window before the last value change, so that local maxima (and
+        # plateaus) at the window edge are fully contained in the next window
+        change_bin_idcs = np.flatnonzero(vals[win_min:win_max-1] != vals[win_min+1:win_max])
+        win_min += change_bin_idcs[-1] if len(change_bin_idcs) > 0 else 0
+        win_max = 2 * win_max
+
+
+def get_align_shift(hit_times, prominence, max_ratio=0.1, offset=2, coarse_bin_width=10):
     """
     Calculates shift for alignement relative to the first peak with given prominence.
     ---
@@ -99,33 +265,76 @@ def get_align_shift(hit_times, prominence, max_ratio=0.1, offset=2):
     prominence (float): The peak prominence
     max_ratio (float): The alignement maximum ratio
     offset (float): The alignement offset
+    coarse_bin_width (int): The bin width [ns] of the coarse histogram limiting the peak search
     ---
     Returns:
     align_shift (float): The align shift
     """
     hit_times = np.asarray(hit_times)
-    x_min, x_max = max(int(hit_times.min()), -100000), min(int(hit_times.max()), 100000)
-    hist = Hist()
-    hist.set_bins(x_max-x_min, x_min, x_max)
-    hist.fill(hit_times)
-    hist.smooth()
-    peak_bin_idcs = hist.get_peak_bin_idcs(prominence)
-    if len(peak_bin_idcs) > 0:
-        bin_idx = peak_bin_idcs[0]
-    else:
-        warn("No peaks found. The maximum is used for alignment.")
-        bin_idx = hist.get_max_bin_idx()
-    max_val = hist.get_val(bin_idx)
-    while bin_idx > 0:
-        val = hist.get_val(bin_idx)
-        if val < max_ratio*max_val or bin_idx == 0:
-            break
-        bin_idx -= 1
-    x_val = hist.get_x_val(bin_idx)-0.5
-    shift = - x_val + offset
+    x_min, x_max = _get_x_range(hit_times)
+    vals = _smooth_vals(_get_hist_vals(hit_times, x_min, x_max))
+    shift = _get_align_shift_from_vals(vals, x_min, prominence, max_ratio, offset, coarse_bin_width)
     return shift
 
 
+def get_align_shifts(hit_times_list, prominence, max_ratio=0.1, offset=2, coarse_bin_width=10, max_bin_num=2**24):
+    """
+    Calculates shifts for alignement relative to the first peak with given prominence for many
+    events at once. The histograms of all events are filled in one pass and smoothed as one 2D
+    array (in chunks of at most max_bin_num bins). The shifts are identical to get_align_shift.
+    ---
+    Parameters:
+    hit_times_list (list[array-like of int]): The hit times of the events
+    prominence (float): The peak prominence
+    max_ratio (float): The alignement maximum ratio
+    offset (float): The alignement offset
+    coarse_bin_width (int): The bin width [ns] of the coarse histogram limiting the peak search
+    max_bin_num (int): The maximum number of histogram bins per chunk
+    ---
+    Returns:
+    align_shifts (array-like of float): The align shifts
+    """
+    hit_times_list = [np.asarray(hit_times) for hit_times in hit_times_list]
+    x_ranges = np.asarray([_get_x_range(hit_times) for hit_times in hit_times_list], dtype=np.intp).reshape(-1, 2)
+    x_mins = x_ranges[:, 0]
+    bin_nums = np.maximum(x_ranges[:, 1] - x_mins, 1)
+    shifts = np.empty(len(hit_times_list), dtype=float)
+    # Linear map of the last window of raw values onto the smoothed edge values (savgol_filter, mode="interp")
+    edge_coeffs = SAVGOL_EDGE_COEFFS[-(SAVGOL_WINDOW_LENGTH//2):]
+    # Events are processed in order of their histogram size to minimize the zero-padding
+    evt_idcs = np.argsort(bin_nums, kind="stable")
+    start = 0
+    while start < len(evt_idcs):
+        ### Collect events while the 2D histogram stays below the maximum bin number
+        stop = start + 1
+        while stop < len(evt_idcs) and (stop - start + 1) * bin_nums[evt_idcs[stop]] <= max_bin_num:
+            stop += 1
+        chunk_evt_idcs = evt_idcs[start:stop]
+        row_num, width = len(chunk_evt_idcs), bin_nums[chunk_evt_idcs[-1]]
+        ### Fill the histograms row by row (the hits are not copied) and smooth them as one 2D array
+        raw_vals = np.zeros((row_num, width), dtype=np.int64)
+        for row_idx, evt_idx in enumerate(chunk_evt_idcs):
+            raw_vals[row_idx, :bin_nums[evt_idx]] = _get_hist_vals(hit_times_list[evt_idx], *x_ranges[evt_idx])
+        vals = _smooth_vals(raw_vals)
+        ### Redo the smoothing at the end of shorter rows, which are zero-padded in the 2D array
+        row_bin_nums = bin_nums[chunk_evt_idcs]
+        edge_row_idcs = np.flatnonzero((row_bin_nums >= SAVGOL_WINDOW_LENGTH) & (row_bin_nums < width))
+        if len(edge_row_idcs) > 0:
+            edge_bin_idcs = row_bin_nums[edge_row_idcs, None] + np.arange(-SAVGOL_WINDOW_LENGTH, 0)
+            edge_vals = raw_vals[edge_row_idcs[:, None], edge_bin_idcs] @ edge_coeffs.T
+            edge_vals = np.maximum(np.ceil(edge_vals), 0)
+            vals[edge_row_idcs[:, None], edge_bin_idcs[:, -edge_vals.shape[1]:]] = edge_vals
+        for row_idx, evt_idx in enumerate(chunk_evt_idcs):
+            bin_num = bin_nums[evt_idx]
+            if bin_num < SAVGOL_WINDOW_LENGTH:
+                row_vals = _smooth_vals(raw_vals[row_idx, :bin_num])
+            else:
+                row_vals = vals[row_idx, :bin_num]
+            shifts[evt_idx] = _get_align_shift_from_vals(row_vals, x_mins[evt_idx], prominence, max_ratio, offset, coarse_bin_width)
+        start = stop
+    return shifts
+
+
 def align(hit_times, prominence, max_ratio=0.1, offset=2, **kwargs):
     """
     Aligns hit times relative to the first peak with given prominence.
@@ -141,12 +350,33 @@ def align(hit_times, prominence, max_ratio=0.1, offset=2, **kwargs):
     """
     hit_times = np.asarray(hit_times)
     shift = get_align_shift(hit_times, prominence, max_ratio, offset)
-    hit_times += shift
+    hit_times = hit_times + shift
     if kwargs.get('rtn_align_shift', False):
         return hit_times, shift
     return hit_times
 
 
+def align_many(hit_times_list, prominence, max_ratio=0.1, offset=2, **kwargs):
+    """
+    Aligns hit times of many events relative to their first peak with given prominence.
+    ---
+    Parameters:
+    hit_times_list (list[array-like of int]): The hit times of the events
+    prominence (float): The peak prominence
+    max_ratio (float): The alignement maximum ratio
+    offset (float): The alignement offset
+    ---
+    Returns:
+    hit_times_list (list[array-like of int]): The aligned hit times of the events
+    """
+    hit_times_list = [np.asarray(hit_times) for hit_times in hit_times_list]
+    shifts = get_align_shifts(hit_times_list, prominence, max_ratio, offset)
+    hit_times_list = [hit_times + float(shift) for hit_times, shift in zip(hit_times_list, shifts)]  # keeps the dtype as in align
+    if kwargs.get('rtn_align_shift', False):
+        return hit_times_list, shifts
+    return hit_times_list
+
+
 def shift(hit_times, shift):
     """
     Shifts hit times.
@@ -159,7 +389,7 @@ def shift(hit_times, shift):
     hit_times (array-like of int): The shifted hit times
     """
     hit_times = np.asarray(hit_times)
-    hit_times += shift
+    hit_times = hit_times + shift
     return hit_times
 
 
@@ -194,21 +424,16 @@ def get_hits(phys_evt, pmt_typ=None, pmt_mfr=None, rtn_track_ids=False):
     hit_pmt_ids (array-like of int): The filtered hit PMT ids
     hit_track_ids (array-like of int, optional): The filtered hit track ids
     """
-    hit_times, hit_pmt_ids = phys_evt.hit_times, phys_evt.hit_pmt_ids
+    hit_arrs = [phys_evt.hit_times, phys_evt.hit_pmt_ids]
     if rtn_track_ids:
-        hit_track_ids = phys_evt.hit_track_ids
-        hit_times, hit_pmt_ids, hit_track_ids = select_pmts(hit_times, hit_pmt_ids, hit_track_ids, pmt_typ=pmt_typ, pmt_mfr=pmt_mfr)
-        mask = ~np.isnan(hit_times) & ~np.isnan(hit_pmt_ids) & ~np.isnan(hit_track_ids)
-        hit_times = hit_times[mask]
-        hit_pmt_ids = hit_pmt_ids[mask]
-        hit_track_ids = hit_track_ids[mask]
-        return hit_times, hit_pmt_ids, hit_track_ids
-    else:
-        hit_times, hit_pmt_ids = select_pmts(hit_times, hit_pmt_ids, pmt_typ=pmt_typ, pmt_mfr=pmt_mfr)
-        mask = ~np.isnan(hit_times) & ~np.isnan(hit_pmt_ids)
-        hit_times = hit_times[mask]
-        hit_pmt_ids = hit_pmt_ids[mask]
-        return hit_times, hit_pmt_ids
+        hit_arrs.append(phys_evt.hit_track_ids)
+    hit_arrs = list(map(np.asarray, hit_arrs))
+    assert all(len(arr) == len(hit_arrs[0]) for arr in hit_arrs)
+    mask = _get_pmt_mask(hit_arrs[1], pmt_typ=pmt_typ, pmt_mfr=pmt_mfr)
+    for arr in hit_arrs:
+        if arr.dtype.kind == "f":
+            mask &= ~np.isnan(arr)
+    return (*[arr[mask] for arr in hit_arrs],)
 
 
 def get_rec_hits(trig_evts, pmt_typ=None, pmt_mfr=None, rtn_charges=False):
@@ -0,0 +1,128 @@
+"""
+PMT identifier utility functions. The identifier -> copy number mapping of the IDService
+is dumped once into a sorted table, so that translations need neither ROOT nor the
+Identifier library.
+"""
+
+__all__ = ["id2copyNo", "build_id_table"]
+
+import ctypes
+
+import numpy as np
+
+from .constants import JUNOSW_DIR, CACHE_DIR
+from . import pmt_utils as pu
+from . import cache_utils as cu
+
+
+ID_TABLE_CACHE_VERSION = 1
+ID_TABLE_CACHE_PTH = f"{CACHE_DIR}/pmt_id_table"
+
+_id_table = None
+
+
+def _declare_id_service():
+    """
+    Declares the IDService helper functions in ROOT and returns the ROOT module.
+    ---
+    Returns:
+    R (module): The ROOT module
+    """
+    import ROOT as R
+    if hasattr(R, "Ids2CopyNos"):
+        return R
+    R.gInterpreter.AddIncludePath("$JUNOTOP/junosw/Detector/Identifier")
+    R.gSystem.Load("libIdentifier.so")
+    R.gInterpreter.Declare("""
+        #include "Identifier/Identifier.h"
+        #include "Identifier/IDService.h"
+        auto getIdServ() {
+            auto idService = IDService::getIdServ();
+            std::streambuf* oldCout = std::cout.rdbuf();
+            std::ostringstream nullStream;
+            std::cout.rdbuf(nullStream.rdbuf());
+            idService->init();
+            std::cout.rdbuf(oldCout);
+            return idService;
+        }
+        auto idService = getIdServ();
+        void Ids2CopyNos(unsigned int* pmtIds, int size, int* copyNos) {
+            for (int i = 0; i < size; ++i) {
+                Identifier id(pmtIds[i]);
+                copyNos[i] = idService->id2CopyNo(id);
+            }
+        }
+        void CopyNos2Ids(int* copyNos, int size, unsigned int* pmtIds) {
+            for (int i = 0; i < size; ++i) {
+                pmtIds[i] = idService->copyNo2Id(copyNos[i]).getValue();
+            }
+        }
+    """)
+    return R
+
+
+def build_id_table():
+    """
+    Builds the PMT identifier -> copy number table with the IDService (requires ROOT and the
+    Identifier library). All CD PMTs of the geometry files are included.
+    ---
+    Returns:
+    arrs (dict[str, array-like of int]): The sorted PMT identifiers and their copy numbers
+    """
+    R = _declare_id_service()
+    copy_nos = np.flatnonzero(pu.pmt_typ_arr != 0).astype(np.int32)
+    pmt_ids = np.zeros(len(copy_nos), dtype=np.uint32)
+    copy_nos_ptr = copy_nos.ctypes.data_as(ctypes.POINTER(ctypes.c_int32))
+    pmt_ids_ptr = pmt_ids.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
+    R.CopyNos2Ids(copy_nos_ptr, len(copy_nos), pmt_ids_ptr)
+    ### Keep only identifiers which translate back to their copy number
+    check_copy_nos = np.zeros(len(pmt_ids), dtype=np.int32)
+    check_copy_nos_ptr = check_copy_nos.ctypes.data_as(ctypes.POINTER(ctypes.c_int32))
+    R.Ids2CopyNos(pmt_ids_ptr, len(pmt_ids), check_copy_nos_ptr)
+    mask = check_copy_nos == copy_nos
+    sort_idcs = np.argsort(pmt_ids[mask], kind="stable")
+    arrs = {"pmt_ids": pmt_ids[mask][sort_idcs], "copy_nos": copy_nos[mask][sort_idcs]}
+    return arrs
+
+
+def _load_id_table():
+    """
+    Loads the PMT identifier -> copy number table from the cache (built if missing or stale).
+    ---
+    Returns:
+    arrs (dict[str, array-like of int]): The sorted PMT identifiers and their copy numbers
+    """
+    fpths = [pu.LPMT_POS_FPTH, pu.SPMT_POS_FPTH]
+    key = cu.get_key(*fpths, version=ID_TABLE_CACHE_VERSION, junosw_dir=JUNOSW_DIR)
+    arrs = cu.load_arrs(ID_TABLE_CACHE_PTH, key)
+    if arrs is None:
+        arrs = build_id_table()
+        try:
+            cu.save_arrs(ID_TABLE_CACHE_PTH, key, **arrs)
+        except OSError:
+            # The cache directory is not usable, keep the table in memory
+            pass
+    return arrs
+
+
+def id2copyNo(pmt_ids):
+    """
+    Translates PMT identifiers to copy numbers.
+    ---
+    Parameters:
+    pmt_ids (array-like of int): The PMT identifiers
+    ---
+    Returns:
+    copy_nos (array-like of int): The PMT copy numbers (-1 for unknown identifiers)
+    """
+    global _id_table
+    if _id_table is None:
+        _id_table = _load_id_table()
+    table_ids, table_copy_nos = _id_table["pmt_ids"], _id_table["copy_nos"]
+    pmt_ids = np.asarray(pmt_ids, dtype=np.uint32)
+    if len(table_ids) == 0:
+        return np.full(pmt_ids.shape, -1, dtype=np.int32)
+    idcs = np.searchsorted(table_ids, pmt_ids)
+    idcs = np.minimum(idcs, len(table_ids) - 1)
+    copy_nos = np.where(table_ids[idcs] == pmt_ids, table_copy_nos[idcs], -1).astype(np.int32)
+    return copy_nos
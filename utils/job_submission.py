@@ -8,19 +8,24 @@ __all__ = ["create_sub_files", "sub_job"]
 import os
 import subprocess
 
+from .env_utils import get_env_sh
 
-def create_sub_files(dir, cmd, run_num):
+
+def create_sub_files(dir, cmd, run_num, setup_script=None):
     """
-    Creates submission files from a given shell command and run number.
+    Creates submission files from a given shell command and run number. The jobs source a cached
+    snapshot of the variables the setup script sets (see env_utils.get_env_sh).
     ---
     Parameters:
     dir (str): The target directory
     cmd (str): The shell command to be executed
     run_num (int): The number of runs
+    setup_script (str, optional): The setup script (default: $JUNOTOP/setup.sh)
     ---
     Example:
     >>> create_sub_files(dir="$WORKSPACE", cmd="echo 'Job ${RUN}'", run_num=50)
     """
+    setup_script = setup_script or f"{os.environ['JUNOTOP']}/setup.sh"
     ### Create submission files directory
     sub_dir = f"{dir}/sub"
     os.makedirs(sub_dir, exist_ok=True)
@@ -35,7 +40,7 @@ def create_sub_files(dir, cmd, run_num):
             f"export WORKSPACE={os.environ['WORKSPACE']}\n"
             f"export PATH={os.environ['PATH']}\n"
             f"export PYTHONPATH={os.environ['PYTHONPATH']}\n\n"
-            f"source {os.environ['JUNOTOP']}/setup.sh\n"
+            f"source {get_env_sh(setup_script)}\n"
             f"cd {dir}\n"
             f"{cmd}\n"
         )
@@ -58,7 +63,7 @@ def create_sub_files(dir, cmd, run_num):
 )
 
 
-def sub_job(dir, cmd=None, run_num=None):
+def sub_job(dir, cmd=None, run_num=None, setup_script=None):
     """
     Submits a job from submission files or from a given shell command and run number.
     ---
@@ -66,6 +71,7 @@ def sub_job(dir, cmd=None, run_num=None):
     dir (str): The target directory
     cmd (str, optional): The shell command to be executed
     run_num (int, optional): The number of runs
+    setup_script (str, optional): The setup script (default: $JUNOTOP/setup.sh)
     ---
     Example:
     >>> sub_job(dir="$WORKSPACE")                                       # w sub files
@@ -73,5 +79,5 @@ def sub_job(dir, cmd=None, run_num=None):
     """
     sub_file_path = f"{dir}/sub/sub.sub"
     if not os.path.isfile(sub_file_path) or (cmd != None and run_num != None):
-        create_sub_files(dir, cmd, run_num)
+        create_sub_files(dir, cmd, run_num, setup_script=setup_script)
     subprocess.run(["condor_submit", sub_file_path])
@@ -27,20 +27,20 @@ def norm(pt_1, pt_2=None):
 
 def sphe_to_cart(pt):
     """
-    Converts a point in spherical to cartesian coordinates.
+    Converts a point (or an array of points) in spherical to cartesian coordinates.
     ---
     Parameters:
-    pt (array-like of float): The point in spherical coordinates
+    pt (array-like of float): The point(s) in spherical coordinates (r, theta, phi) [deg], shape (3,) or (N, 3)
     ---
     Returns:
-    pt (array-like of float): The point in cartesian coordinates
+    pt (array-like of float): The point(s) in cartesian coordinates (x, y, z)
     """
-    pt = np.asarray(pt)
-    assert pt.shape == (3,)
-    theta = np.radians(pt[1])
-    phi = np.radians(pt[2])
-    x = pt[0] * np.sin(theta) * np.cos(phi)
-    y = pt[0] * np.sin(theta) * np.sin(phi)
-    z = pt[0] * np.cos(theta)
-    pt = np.asarray([x, y, z])
+    pt = np.asarray(pt, dtype=float)
+    assert pt.shape[-1] == 3
+    theta = np.radians(pt[..., 1])
+    phi = np.radians(pt[..., 2])
+    x = pt[..., 0] * np.sin(theta) * np.cos(phi)
+    y = pt[..., 0] * np.sin(theta) * np.sin(phi)
+    z = pt[..., 0] * np.cos(theta)
+    pt = np.stack([x, y, z], axis=-1)
     return pt
@@ -4,43 +4,63 @@ The parameter paths to access data in the simulation files.
 
 __all__ = ["PAR_PTHS"]
 
-import ctypes
-
-import ROOT as R
 import numpy as np
 
+from .id_utils import id2copyNo
+from .root_utils import read_calib_hits
+
+
+def _copy(val):
+    """
+    Returns a copy of a branch value that is independent of the tree buffers, which are
+    overwritten by the next GetEntry.
+    ---
+    Parameters:
+    val (any): The branch value (e.g. tree.hitTime, tree.InitX)
+    ---
+    Returns:
+    val (float or array-like): The copied value (float for scalars)
+    """
+    arr = np.array(val, copy=True)
+    return float(arr) if arr.ndim == 0 else arr
+
+
+_calib_hits_cache = {}  # Collection name -> (tree entry key, hits) of the last read entry
 
-R.gInterpreter.AddIncludePath("$JUNOTOP/junosw/Detector/Identifier")
-R.gSystem.Load("libIdentifier.so")
-R.gInterpreter.Declare("""
-    #include "Identifier/Identifier.h"
-    #include "Identifier/IDService.h"
-    auto getIdServ() {
-        auto idService = IDService::getIdServ();
-        std::streambuf* oldCout = std::cout.rdbuf();
-        std::ostringstream nullStream;
-        std::cout.rdbuf(nullStream.rdbuf());
-        idService->init();
-        std::cout.rdbuf(oldCout);
-        return idService;
-    }
-    auto idService = getIdServ();
-    void Ids2CopyNos(unsigned int* pmtIds, int size, int* copyNos) {
-        for (int i = 0; i < size; ++i) {
-            Identifier id(pmtIds[i]);
-            copyNos[i] = idService->id2CopyNo(id);
-        }
-    }
-""")
 
+def _get_calib_hits(tree, collection_nm):
+    """
+    Returns the hits of a calibration collection for the current tree entry. Each collection is read
+    once per entry, the rec_hit_times, rec_hit_pmt_ids and rec_hit_charges paths share the result.
+    ---
+    Parameters:
+    tree (TTree): The calibration tree (after GetEntry)
+    collection_nm (str): The collection name (CdLpmtCalibEvt, CdSpmtCalibEvt)
+    ---
+    Returns:
+    hits (dict[str, array-like]): The channel and hit arrays (see root_utils.read_calib_hits)
+    """
+    key = (id(tree), tree.GetCurrentFile().GetName(), tree.GetReadEntry())
+    cached = _calib_hits_cache.get(collection_nm)
+    if cached is None or cached[0] != key:
+        cached = (key, read_calib_hits(getattr(tree, collection_nm)))
+        _calib_hits_cache[collection_nm] = cached
+    return cached[1]
 
-def _id2copyNo(pmt_ids):
-    pmt_ids = np.array(pmt_ids, dtype=np.uint32)
-    copy_nos = np.zeros(len(pmt_ids), dtype=np.int32)
-    pmt_ids_ptr = pmt_ids.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
-    copy_nos_ptr = copy_nos.ctypes.data_as(ctypes.POINTER(ctypes.c_int32))
-    R.Ids2CopyNos(pmt_ids_ptr, len(pmt_ids), copy_nos_ptr)
-    return copy_nos
+
+def _get_channel_charges(hits):
+    """
+    Returns the summed charge of each channel of a calibration collection.
+    ---
+    Parameters:
+    hits (dict[str, array-like]): The channel and hit arrays (see root_utils.read_calib_hits)
+    ---
+    Returns:
+    charges (array-like of float): The channel charges
+    """
+    channel_num = len(hits["pmt_ids"])
+    channel_idcs = np.repeat(np.arange(channel_num), np.diff(hits["offsets"]))
+    return np.bincount(channel_idcs, weights=hits["charges"], minlength=channel_num)
 
 
 PAR_PTHS = [
@@ -50,7 +70,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "geninfo": lambda tree: (tree.InitX, tree.InitY, tree.InitZ)
+            "geninfo": lambda tree: (_copy(tree.InitX), _copy(tree.InitY), _copy(tree.InitZ))
         }
     },
     {
@@ -59,7 +79,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "geninfo": lambda tree: (tree.InitPX, tree.InitPY, tree.InitPZ)
+            "geninfo": lambda tree: (_copy(tree.InitPX), _copy(tree.InitPY), _copy(tree.InitPZ))
         }
     },
     {
@@ -68,7 +88,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "evt": lambda tree: tree.edep
+            "evt": lambda tree: _copy(tree.edep)
         }
     },
     {
@@ -95,7 +115,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "evt": lambda tree: np.asarray(tree.hitTime)
+            "evt": lambda tree: _copy(tree.hitTime)
         }
     },
     {
@@ -104,7 +124,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "evt": lambda tree: np.asarray(tree.pmtID)
+            "evt": lambda tree: _copy(tree.pmtID)
         }
     },
     {
@@ -113,7 +133,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["det"],
         "get_funcs": {
-            "evt": lambda tree: np.asarray(tree.PETrackID)
+            "evt": lambda tree: _copy(tree.PETrackID)
         }
     },
     {
@@ -131,8 +151,8 @@ PAR_PTHS = [
         "file_type":    "edm",
         "sim_part_nms": ["calib", "rec"],
         "get_funcs": {
-            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: np.asarray([calibPmtChannel.time() for calibPmtChannel in tree.CdLpmtCalibEvt.calibPMTCol()]),
-            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: np.asarray([calibPmtChannel.time() for calibPmtChannel in tree.CdSpmtCalibEvt.calibPMTCol()])
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdLpmtCalibEvt")["times"],
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdSpmtCalibEvt")["times"]
         }
     },
     {
@@ -141,8 +161,8 @@ PAR_PTHS = [
         "file_type":    "edm",
         "sim_part_nms": ["calib", "rec"],
         "get_funcs": {
-            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: _id2copyNo([calibPmtChannel.pmtId() for calibPmtChannel in tree.CdLpmtCalibEvt.calibPMTCol()]),
-            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: _id2copyNo([calibPmtChannel.pmtId() for calibPmtChannel in tree.CdSpmtCalibEvt.calibPMTCol()])
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: id2copyNo(_get_calib_hits(tree, "CdLpmtCalibEvt")["hit_pmt_ids"]),
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: id2copyNo(_get_calib_hits(tree, "CdSpmtCalibEvt")["hit_pmt_ids"])
         }
     },
     {
@@ -151,8 +171,38 @@ PAR_PTHS = [
         "file_type":    "edm",
         "sim_part_nms": ["calib", "rec"],
         "get_funcs": {
-            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: np.asarray([calibPmtChannel.charge() for calibPmtChannel in tree.CdLpmtCalibEvt.calibPMTCol()]),
-            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: np.asarray([calibPmtChannel.charge() for calibPmtChannel in tree.CdSpmtCalibEvt.calibPMTCol()])
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdLpmtCalibEvt")["charges"],
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdSpmtCalibEvt")["charges"]
+        }
+    },
+    {
+        "par_nm":       "rec_first_hit_times",
+        "evt_type":     "trig",
+        "file_type":    "edm",
+        "sim_part_nms": ["calib", "rec"],
+        "get_funcs": {
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdLpmtCalibEvt")["first_hit_times"],
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: _get_calib_hits(tree, "CdSpmtCalibEvt")["first_hit_times"]
+        }
+    },
+    {
+        "par_nm":       "rec_first_hit_pmt_ids",
+        "evt_type":     "trig",
+        "file_type":    "edm",
+        "sim_part_nms": ["calib", "rec"],
+        "get_funcs": {
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: id2copyNo(_get_calib_hits(tree, "CdLpmtCalibEvt")["pmt_ids"]),
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: id2copyNo(_get_calib_hits(tree, "CdSpmtCalibEvt")["pmt_ids"])
+        }
+    },
+    {
+        "par_nm":       "rec_first_hit_charges",
+        "evt_type":     "trig",
+        "file_type":    "edm",
+        "sim_part_nms": ["calib", "rec"],
+        "get_funcs": {
+            "Event/CdLpmtCalib/CdLpmtCalibEvt": lambda tree: _get_channel_charges(_get_calib_hits(tree, "CdLpmtCalibEvt")),
+            "Event/CdSpmtCalib/CdSpmtCalibEvt": lambda tree: _get_channel_charges(_get_calib_hits(tree, "CdSpmtCalibEvt"))
         }
     },
     {
@@ -161,7 +211,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["rec"],
         "get_funcs": {
-            "TRec": lambda tree: (tree.recx, tree.recy, tree.recz)
+            "TRec": lambda tree: (_copy(tree.recx), _copy(tree.recy), _copy(tree.recz))
         }
     },
     {
@@ -170,7 +220,7 @@ PAR_PTHS = [
         "file_type":    "usr",
         "sim_part_nms": ["rec"],
         "get_funcs": {
-            "TRec": lambda tree: tree.m_QTEn
+            "TRec": lambda tree: _copy(tree.m_QTEn)
         }
     },
     {
@@ -0,0 +1,114 @@
+"""
+Pipeline runner. Each stage of each file is a task with dependencies on other tasks. A task
+is started as soon as all its dependencies are finished, independent tasks run concurrently
+up to a global limit.
+"""
+
+__all__ = ["Task", "run_pipeline"]
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Task:
+    """
+    A pipeline task: a command (or Python function) with the names of the tasks it depends on.
+    ---
+    Example:
+    >>> Task("det2elec:mu-_1", ["python", "tut_det2elec.py", ...], deps=["detsim:mu-_1"])
+    """
+
+    def __init__(self, nm, cmd, deps=()):
+        self.nm = nm
+        self.cmd = cmd
+        self.deps = list(deps)
+
+    def run(self):
+        if callable(self.cmd):
+            self.cmd()
+        else:
+            subprocess.run(self.cmd, check=True)
+
+
+def _get_dependents(tasks):
+    """
+    Returns the names of the tasks depending on each task.
+    """
+    dependents = {nm: [] for nm in tasks}
+    for task in tasks.values():
+        for dep in task.deps:
+            dependents[dep].append(task.nm)
+    return dependents
+
+
+def _get_depths(tasks):
+    """
+    Returns the depth of each task (number of tasks on the longest dependency chain before it).
+    """
+    depths = {}
+    def get_depth(nm, path=()):
+        if nm not in depths:
+            if nm in path:
+                raise ValueError(f"Cyclic dependencies between {sorted(path)}")
+            depths[nm] = max((get_depth(dep, (*path, nm)) + 1 for dep in tasks[nm].deps), default=0)
+        return depths[nm]
+    for nm in tasks:
+        get_depth(nm)
+    return depths
+
+
+def run_pipeline(tasks, max_workers=None):
+    """
+    Runs tasks in dependency order. Of the ready tasks, later stages are started first, so that
+    file chains are finished early. Tasks depending on a failed task are skipped.
+    ---
+    Parameters:
+    tasks (list[Task]): The tasks
+    max_workers (int, optional): The maximum number of concurrently running tasks (default: CPU number)
+    ---
+    Returns:
+    states (dict[str, str]): The final task states by task name (done, failed, skipped)
+    """
+    tasks = {task.nm: task for task in tasks}
+    assert all(dep in tasks for task in tasks.values() for dep in task.deps), "Unknown dependency"
+    max_workers = max_workers or os.cpu_count() or 1
+    dependents = _get_dependents(tasks)
+    depths = _get_depths(tasks)
+    orders = {nm: order for order, nm in enumerate(tasks)}
+    dep_nums = {nm: len(task.deps) for nm, task in tasks.items()}
+    states = {}
+    ready_nms = [nm for nm, dep_num in dep_nums.items() if dep_num == 0]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while ready_nms or futures:
+            ### Start ready tasks up to the limit (deepest first)
+            ready_nms.sort(key=lambda nm: (-depths[nm], orders[nm]))
+            while ready_nms and len(futures) < max_workers:
+                nm = ready_nms.pop(0)
+                print(f"[pipeline] starting {nm}")
+                futures[executor.submit(tasks[nm].run)] = nm
+            ### Release the dependents of finished tasks
+            done_futures, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                nm = futures.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    states[nm] = "failed"
+                    print(f"[pipeline] {nm} failed: {e}")
+                    skip_nms = list(dependents[nm])
+                    while skip_nms:
+                        skip_nm = skip_nms.pop()
+                        if skip_nm not in states:
+                            states[skip_nm] = "skipped"
+                            print(f"[pipeline] skipping {skip_nm}")
+                            skip_nms.extend(dependents[skip_nm])
+                    continue
+                states[nm] = "done"
+                print(f"[pipeline] {nm} done")
+                for dependent_nm in dependents[nm]:
+                    dep_nums[dependent_nm] -= 1
+                    if dep_nums[dependent_nm] == 0 and dependent_nm not in states:
+                        ready_nms.append(dependent_nm)
+    return states
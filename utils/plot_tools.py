@@ -14,6 +14,7 @@ from matplotlib.ticker import MaxNLocator,ScalarFormatter,MultipleLocator
 from matplotlib.ticker import FormatStrFormatter
 
 from .plot_constants import *
+from .ana_tools import Hist
 
 
 plt.rcParams["font.size"] = FONT_SIZE
@@ -34,6 +35,11 @@ def custom_log_formatter(val, _):
 class Ax:
     
     def __init__(self, ax):
+        self.ax = ax
+        self._setup()
+    
+    def _setup(self):
+        ax = self.ax
         ax.ticklabel_format(axis="x", scilimits=[-3, 3])
         ax.ticklabel_format(axis="y", scilimits=[-3, 3])
 
@@ -42,10 +48,14 @@ class Ax:
 
         # Ticklabels auf max. 1 Nachkommastelle
         #ax.yaxis.set_major_formatter(lambda x, _: f"{x:.1f}")
-        
-        self.ax = ax
+    
+    def clear(self):
+        self.ax.clear()
+        self._setup()
     
     def add(self, obj, **kwargs):
+        if isinstance(obj, str):
+            obj = Hist.load(obj)  # Histogram sidecar file (see Hist.save)
         obj.plot(self.ax, **kwargs)
     
     def get_xlim(self):
@@ -114,11 +124,12 @@ class Plot(Ax):
         super().__init__(ax)
         self.fig = fig
     
-    def savefig(self, *args, **kwargs):
+    def savefig(self, *args, dpi=600, close=True, **kwargs):
         with catch_warnings():
             simplefilter("ignore", UserWarning)
-            self.fig.savefig(*args, dpi=600, **kwargs)
-        plt.close(self.fig)
+            self.fig.savefig(*args, dpi=dpi, **kwargs)
+        if close:
+            plt.close(self.fig)
 
 
 class MultiPlot:
@@ -133,11 +144,16 @@ class MultiPlot:
     def __getitem__(self, index):
         return self.axs[index]
     
-    def savefig(self, *args, **kwargs):
+    def clear(self):
+        for ax in self.axs.flat:
+            ax.clear()
+    
+    def savefig(self, *args, dpi=600, close=True, **kwargs):
         with catch_warnings():
             simplefilter("ignore", UserWarning)
-            self.fig.savefig(*args, dpi=600, **kwargs)
-        plt.close(self.fig)
+            self.fig.savefig(*args, dpi=dpi, **kwargs)
+        if close:
+            plt.close(self.fig)
 
 
 class ColorIterator:
@@ -2,14 +2,16 @@
 PMT utility functions.
 """
 
-__all__ = ["pmt_typ", "pmt_pos", "pmt_mfr", "pmt_tof"]
+__all__ = ["PMT_TYPS", "pmt_typ_code", "pmt_mfr_code", "pmt_typ", "pmt_pos", "pmt_mfr", "pmt_tofs", "pmt_tof"]
 
 from collections.abc import Iterable
+from functools import lru_cache
 
 import numpy as np
 
-from .constants import JUNOSW_DIR, IS_JUNOSW
+from .constants import JUNOSW_DIR, IS_JUNOSW, CACHE_DIR
 from . import math_utils as mu
+from . import cache_utils as cu
 
 
 R_S = 17700    # Radius of the JUNO CD to the acrylics sphere [mm]
@@ -23,44 +25,124 @@ SPMT_POS_FPTH = f"{GEOMETRY_DIR}/PMTPos_CD_SPMT.csv"
 LPMT_MFR_FPTH = f"{GEOMETRY_DIR}/PMTType_CD_LPMT.csv"
 SPMT_MFR_FPTH = f"{GEOMETRY_DIR}/PMTType_CD_SPMT.csv"
 
+PMT_TYPS = ["lpmt", "spmt"]  # PMT type names (code = index + 1, code 0 = unknown)
 
-if IS_JUNOSW:
-    ### Find maximum PMT id
-    max_pmt_id = 0
-    for file_pth in [LPMT_POS_FPTH, SPMT_POS_FPTH]:
-        with open(file_pth, "r") as file:
-            for line in file:
-                pass
-            last_line = line
-            id = int(line.split()[0])
-            max_pmt_id = max(max_pmt_id, id)
-    ### Define PMT data arrays
-    pmt_typ_arr = np.full(max_pmt_id + 1, None, dtype=object)
-    pmt_mfr_arr = np.full(max_pmt_id + 1, None, dtype=object)
-    pmt_pos_arr = np.full((max_pmt_id + 1, 3), np.nan, dtype=float)
+GEOMETRY_CACHE_VERSION = 2
+GEOMETRY_CACHE_PTH = f"{CACHE_DIR}/pmt_geometry"
+
+
+def _read_table(file_pth):
+    """
+    Reads a PMT table file, skipping comment and header lines.
+    ---
+    Parameters:
+    file_pth (str): The table file path
+    ---
+    Returns:
+    table (array-like of str): The table entries, shape (N, column number)
+    """
+    with open(file_pth, "r") as file:
+        lines = [line for line in file if not line.startswith(("#", "\""))]
+    table = np.loadtxt(lines, dtype=str, ndmin=2)
+    return table
+
+
+def _build_geometry():
+    """
+    Builds the PMT data arrays from the geometry files. PMT types and manufacturers are stored
+    as uint8 codes, which index the name arrays (code 0 = unknown).
+    ---
+    Returns:
+    arrs (dict[str, array-like]): The PMT type codes, manufacturer codes and positions indexed by PMT id,
+        and the manufacturer names
+    """
     ### Load PMT types and positions from position files
-    for file_pth, typ in zip([LPMT_POS_FPTH, SPMT_POS_FPTH], ["lpmt", "spmt"]):
-        with open(file_pth, "r") as file:
-            for line in file:
-                if line.startswith(("#", "\"")):
-                    continue
-                line = line.split()
-                id = int(line[0])
-                theta = float(line[-2])
-                phi = float(line[-1])
-                pos = mu.sphe_to_cart((R_PMT, theta, phi))
-                pmt_typ_arr[id] = typ
-                pmt_pos_arr[id] = pos
+    pos_tables = [_read_table(file_pth) for file_pth in [LPMT_POS_FPTH, SPMT_POS_FPTH]]
+    mfr_tables = [_read_table(file_pth) for file_pth in [LPMT_MFR_FPTH, SPMT_MFR_FPTH]]
+    max_pmt_id = max(int(table[:, 0].astype(int).max()) for table in pos_tables if len(table) > 0)
+    pmt_typ_arr = np.zeros(max_pmt_id + 1, dtype=np.uint8)
+    pmt_mfr_arr = np.zeros(max_pmt_id + 1, dtype=np.uint8)
+    pmt_pos_arr = np.full((max_pmt_id + 1, 3), np.nan, dtype=float)
+    for typ_code, table in enumerate(pos_tables, start=1):
+        ids = table[:, 0].astype(int)
+        sphe_pos = np.column_stack([np.full(len(ids), R_PMT), table[:, -2].astype(float), table[:, -1].astype(float)])
+        pmt_typ_arr[ids] = typ_code
+        pmt_pos_arr[ids] = mu.sphe_to_cart(sphe_pos)
     ### Load PMT manufacturers from manufacturer files
-    for file_pth in [LPMT_MFR_FPTH, SPMT_MFR_FPTH]:
-        with open(file_pth, "r") as file:
-            for line in file:
-                if line.startswith(("#", "\"")):
-                    continue
-                line = line.split()
-                id = int(line[0])
-                mfr = line[1]
-                pmt_mfr_arr[id] = mfr
+    pmt_mfr_nms = np.unique(np.concatenate([table[:, 1] for table in mfr_tables]))
+    assert len(pmt_mfr_nms) < 255
+    for table in mfr_tables:
+        ids = table[:, 0].astype(int)
+        ids_mask = ids <= max_pmt_id
+        pmt_mfr_arr[ids[ids_mask]] = np.searchsorted(pmt_mfr_nms, table[ids_mask, 1]) + 1
+    arrs = {"pmt_typ_arr": pmt_typ_arr, "pmt_mfr_arr": pmt_mfr_arr, "pmt_pos_arr": pmt_pos_arr, "pmt_mfr_nms": pmt_mfr_nms}
+    return arrs
+
+
+def _load_geometry():
+    """
+    Loads the PMT data arrays from the geometry cache (read-only memory maps). The cache is
+    (re)built if it is missing or if any geometry file has changed.
+    ---
+    Returns:
+    arrs (dict[str, array-like]): The PMT type codes, manufacturer codes and positions indexed by PMT id,
+        and the manufacturer names
+    """
+    fpths = [LPMT_POS_FPTH, SPMT_POS_FPTH, LPMT_MFR_FPTH, SPMT_MFR_FPTH]
+    key = cu.get_key(*fpths, version=GEOMETRY_CACHE_VERSION, r_pmt=R_PMT)
+    arrs = cu.load_arrs(GEOMETRY_CACHE_PTH, key)
+    if arrs is None:
+        built_arrs = _build_geometry()
+        try:
+            cu.save_arrs(GEOMETRY_CACHE_PTH, key, **built_arrs)
+            arrs = cu.load_arrs(GEOMETRY_CACHE_PTH, key)
+        except OSError:
+            pass
+        if arrs is None:
+            # The cache directory is not usable, keep the arrays in memory
+            arrs = built_arrs
+    return arrs
+
+
+if IS_JUNOSW:
+    _geometry = _load_geometry()
+    pmt_typ_arr = _geometry["pmt_typ_arr"]
+    pmt_mfr_arr = _geometry["pmt_mfr_arr"]
+    pmt_pos_arr = _geometry["pmt_pos_arr"]
+    max_pmt_id = len(pmt_pos_arr) - 1
+    ### Define code <-> name mappings
+    pmt_typ_nms = np.asarray([None, *PMT_TYPS], dtype=object)
+    pmt_mfr_nms = np.asarray([None, *_geometry["pmt_mfr_nms"].tolist()], dtype=object)
+    pmt_typ_codes = {nm: code for code, nm in enumerate(pmt_typ_nms) if nm is not None}
+    pmt_mfr_codes = {nm: code for code, nm in enumerate(pmt_mfr_nms) if nm is not None}
+
+
+def pmt_typ_code(pmt_typ):
+    """
+    Returns the code of a PMT type.
+    ---
+    Parameters:
+    pmt_typ (str): The PMT type (lpmt, spmt)
+    ---
+    Returns:
+    code (int): The PMT type code (as stored in pmt_typ_arr)
+    """
+    assert pmt_typ in pmt_typ_codes, f"Unknown PMT type {pmt_typ!r}"
+    return pmt_typ_codes[pmt_typ]
+
+
+def pmt_mfr_code(pmt_mfr):
+    """
+    Returns the code of a PMT manufacturer.
+    ---
+    Parameters:
+    pmt_mfr (str): The PMT manufacturer (Hamamatsu, HighQENNVT, HZC)
+    ---
+    Returns:
+    code (int): The PMT manufacturer code (as stored in pmt_mfr_arr)
+    """
+    assert pmt_mfr in pmt_mfr_codes, f"Unknown PMT manufacturer {pmt_mfr!r}"
+    return pmt_mfr_codes[pmt_mfr]
 
 
 def pmt_typ(pmt_ids):
@@ -77,8 +159,7 @@ def pmt_typ(pmt_ids):
     pmt_ids = np.atleast_1d(np.asarray(pmt_ids))
     if len(pmt_ids) == 0:
         return np.asarray([])
-    result = np.full(pmt_ids.shape, None, dtype=object)
-    result = pmt_typ_arr[pmt_ids]
+    result = pmt_typ_nms[pmt_typ_arr[pmt_ids]]
     return result if is_seq else result[0]
 
 
@@ -115,41 +196,136 @@ def pmt_mfr(pmt_ids):
     pmt_ids = np.atleast_1d(np.asarray(pmt_ids))
     if len(pmt_ids) == 0:
         return np.asarray([])
-    result = np.full(pmt_ids.shape, None, dtype=object)
-    result = pmt_mfr_arr[pmt_ids]
+    result = pmt_mfr_nms[pmt_mfr_arr[pmt_ids]]
     return result if is_seq else result[0]
 
 
-def pmt_tof(pmt_ids, evt_pos):
+def _calc_tofs(pos_t, evt_poss, tof, buf_1, buf_2):
+    """
+    Calculates PMT TOF values in place (see pmt_tofs).
+    ---
+    Parameters:
+    pos_t (array-like of float): The PMT positions, shape (3, N)
+    evt_poss (array-like of float): The event positions, shape (M, 3)
+    tof (array-like of float): The output array, shape (M, N)
+    buf_1, buf_2 (array-like of float): The temporary arrays, shape (M, N)
+    """
+    ### Calculate total distance between event and PMT
+    d = tof
+    np.subtract(pos_t[0], evt_poss[:, 0, None], out=d)
+    np.square(d, out=d)
+    for k in (1, 2):
+        np.subtract(pos_t[k], evt_poss[:, k, None], out=buf_1)
+        np.square(buf_1, out=buf_1)
+        d += buf_1
+    np.sqrt(d, out=d)
+    ### Calculate distance in water
+    r_sq = np.sum(evt_poss**2, axis=1)[:, None]
+    cos_theta = buf_1
+    np.square(d, out=cos_theta)
+    cos_theta += R_PMT**2
+    cos_theta -= r_sq
+    cos_theta /= d
+    cos_theta /= 2 * R_PMT
+    np.clip(cos_theta, -1, 1, out=cos_theta)
+    # R_S**2 - R_PMT**2 * sin(theta)**2 is negative if the light path misses the acrylics sphere,
+    # in which case the full path is in water (d_h2o = R_PMT * cos(theta))
+    root = buf_2
+    np.square(cos_theta, out=root)
+    root *= R_PMT**2
+    root += R_S**2 - R_PMT**2
+    np.maximum(root, 0, out=root)
+    np.sqrt(root, out=root)
+    d_h2o = cos_theta
+    d_h2o *= R_PMT
+    d_h2o -= root
+    ### Calculate TOF (d_ls = d - d_h2o)
+    d_h2o *= N_H2O - N_LS
+    d *= N_LS
+    d += d_h2o
+    d /= 300
+    tof[np.isnan(tof)] = 0
+
+
+def pmt_tofs(pmt_ids, evt_poss, dtype=float, out=None, max_mem=2**27):
+    """
+    Returns PMT TOF values for given PMT ids and multiple event positions. The event positions
+    are processed in chunks, so that the temporary arrays stay below max_mem.
+    ---
+    Parameters:
+    pmt_ids (array-like of int): The PMT ids, shape (N,)
+    evt_poss (array-like of float): The event positions (x, y, z), shape (M, 3)
+    dtype (type, optional): The floating-point type of the calculation (float or np.float32, the latter
+        is accurate to ~1e-3 ns for events inside the acrylics sphere)
+    out (array-like of float, optional): The output array to be reused, shape (M, N)
+    max_mem (int, optional): The maximum memory of the temporary arrays [bytes]
+    ---
+    Returns:
+    pmt_tofs (array-like of float): The PMT TOF values [ns], shape (M, N)
+    """
+    dtype = np.dtype(dtype)
+    pmt_ids = np.atleast_1d(np.asarray(pmt_ids))
+    evt_poss = np.atleast_2d(np.asarray(evt_poss, dtype=dtype))
+    assert pmt_ids.ndim == 1 and evt_poss.shape[1] == 3
+    assert np.all(pmt_ids >= 0), "Negative PMT ids (e.g. -1 from id2copyNo for unknown identifiers) have to be removed first"
+    shape = (len(evt_poss), len(pmt_ids))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    assert out.shape == shape and out.dtype == dtype
+    if out.size == 0:
+        return out
+    pos_t = np.ascontiguousarray(pmt_pos_arr[pmt_ids].T, dtype=dtype)
+    chunk_size = max(1, min(shape[0], max_mem // (2 * shape[1] * dtype.itemsize)))
+    bufs = np.empty((2, chunk_size, shape[1]), dtype=dtype)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, shape[0], chunk_size):
+            stop = min(start + chunk_size, shape[0])
+            _calc_tofs(pos_t, evt_poss[start:stop], out[start:stop], bufs[0, :stop-start], bufs[1, :stop-start])
+    return out
+
+
+@lru_cache(maxsize=8)
+def _get_tof_table(evt_pos):
+    """
+    Returns the PMT TOF values of all PMT ids for an event position (cached, read-only).
+    ---
+    Parameters:
+    evt_pos (tuple[float]): The event position (x, y, z)
+    ---
+    Returns:
+    tof_table (array-like of float): The PMT TOF values [ns] indexed by PMT id
+    """
+    tof_table = pmt_tofs(np.arange(len(pmt_pos_arr)), [evt_pos])[0]
+    tof_table.flags.writeable = False
+    return tof_table
+
+
+def pmt_tof(pmt_ids, evt_pos, backend=None):
     """
     Returns PMT TOF values for given PMT ids and an event position.
     ---
     Parameters:
     pmt_ids (int or array-like of int): The PMT ids
     evt_pos (tuple[float]): The event position (x, y, z)
+    backend (str, optional): The calculation backend, both give identical values
+        "direct": TOF calculation for every given PMT id
+        "table": lookup in a table of all PMTs, which is computed once per event position
+        None: "table" if there are more PMT ids (e.g. hits) than PMTs, "direct" otherwise
     ---
     Returns:
     pmt_tofs (float or array-like of float): The PMT TOF values [ns]
     """
     assert len(evt_pos) == 3
+    assert backend in [None, "direct", "table"]
     is_seq = isinstance(pmt_ids, Iterable)
     pmt_ids = np.atleast_1d(np.asarray(pmt_ids))
-    evt_pos = np.asarray(evt_pos)
     if len(pmt_ids) == 0:
         return np.asarray([])
-    pos = np.atleast_2d(pmt_pos(pmt_ids))
-    ### Calculate total distance between event and PMT
-    d = np.sqrt(np.sum((pos - evt_pos)**2, axis=1))
-    ### Calculate distance in water
-    r = np.sqrt(np.sum(evt_pos**2))
-    cos_theta = (R_PMT**2 + d**2 - r**2) / (2 * R_PMT * d)
-    cos_theta = np.clip(cos_theta, -1, 1)
-    theta = np.arccos(cos_theta)
-    d_h2o = (R_PMT * np.cos(theta)) - np.sqrt(R_S**2 - (R_PMT**2 * np.sin(theta)**2))
-    d_h2o = np.where(np.isnan(d_h2o), R_PMT * np.cos(theta), d_h2o)
-    ### Calculate distance in liquid scintillator
-    d_ls = d - d_h2o
-    ### Calculate TOF
-    tof = ((d_ls * N_LS) + (d_h2o * N_H2O)) / 300
-    tof = np.where(np.isnan(tof), 0, tof)
+    assert np.all(pmt_ids >= 0), "Negative PMT ids (e.g. -1 from id2copyNo for unknown identifiers) have to be removed first"
+    if backend is None:
+        backend = "table" if pmt_ids.size > len(pmt_pos_arr) else "direct"
+    if backend == "table":
+        tof = _get_tof_table(tuple(float(x) for x in evt_pos))[pmt_ids]
+    else:
+        tof = pmt_tofs(pmt_ids, [evt_pos])[0]
     return tof if is_seq else tof[0]
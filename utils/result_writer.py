@@ -0,0 +1,162 @@
+"""
+Analysis result writer. All records of a run are written through one handle into a single
+.npz file (one entry per record array), which can be loaded again with np.load or load_results.
+"""
+
+__all__ = ["ResultWriter", "load_results", "get_summary_lines", "write_summary"]
+
+import os
+import zipfile
+
+import numpy as np
+
+
+SEP = "/"  # Separator of the record name and the array name in the .npz entry names
+
+
+class ResultWriter:
+    """
+    Writes analysis records into one .npz file. The file is written under a temporary name
+    and moved into place on close.
+    ---
+    Example:
+    >>> with ResultWriter("Simulation_Muon_results.npz") as writer:
+    ...     writer.write("mu-_1/detsim/lpmt", hit_times=hit_times, align_shifts=align_shifts)
+    """
+
+    def __init__(self, file_pth):
+        self.file_pth = file_pth
+        self.tmp_pth = f"{file_pth}.tmp{os.getpid()}"
+        self.zip_file = zipfile.ZipFile(self.tmp_pth, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.record_nms = []
+
+    def write(self, record_nm, **arrs):
+        """
+        Writes a record.
+        ---
+        Parameters:
+        record_nm (str): The record name (e.g. {file name}/{stage}/{PMT type})
+        arrs (array-like of any): The record arrays (no object arrays)
+        """
+        assert record_nm not in self.record_nms, f"Record {record_nm!r} already written"
+        for nm, arr in arrs.items():
+            with self.zip_file.open(f"{record_nm}{SEP}{nm}.npy", mode="w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asarray(arr), allow_pickle=False)
+        self.record_nms.append(record_nm)
+
+    def close(self):
+        """
+        Finishes the file and moves it into place.
+        """
+        self.zip_file.close()
+        os.replace(self.tmp_pth, self.file_pth)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.zip_file.close()
+            os.remove(self.tmp_pth)
+
+
+def load_results(file_pth):
+    """
+    Loads the records of a result file.
+    ---
+    Parameters:
+    file_pth (str): The result file path
+    ---
+    Returns:
+    results (dict[str, dict[str, array-like of any]]): The record arrays by record name (in written order)
+    """
+    results = {}
+    with np.load(file_pth, allow_pickle=False) as npz_file:
+        for key in npz_file.files:
+            record_nm, nm = key.rsplit(SEP, 1)
+            results.setdefault(record_nm, {})[nm] = npz_file[key]
+    return results
+
+
+def _format_arr(arr, max_num=10, length=None):
+    """
+    Returns a short string of the first values of an array (length: the full array length if only
+    the first values are given).
+    """
+    arr = np.asarray(arr)
+    if arr.ndim == 0:
+        return str(arr)
+    length = len(arr) if length is None else length
+    arr_str = np.array2string(arr[:max_num], precision=3, separator=" ", max_line_width=10**6).replace("\n", "")
+    return f"{arr_str} ({length} values)" if length > max_num else arr_str
+
+
+def _read_head(f, max_num):
+    """
+    Reads the first rows of an .npy entry without reading the whole array.
+    ---
+    Parameters:
+    f (file): The opened .npy entry
+    max_num (int): The maximum number of rows
+    ---
+    Returns:
+    head (array-like of any): The first rows
+    length (int or None): The number of rows (None for 0-d arrays)
+    """
+    version = np.lib.format.read_magic(f)
+    read_header = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}.get(version)
+    shape, fortran_order, dtype = read_header(f) if read_header is not None else ((), False, None)
+    if len(shape) == 0 or fortran_order:  # Scalars, Fortran order and header version 3.0 are read completely
+        f.seek(0)
+        arr = np.lib.format.read_array(f, allow_pickle=False)
+        return arr, (len(arr) if arr.ndim > 0 else None)
+    row_size = int(np.prod(shape[1:], dtype=np.int64))
+    row_num = min(max_num, shape[0])
+    head = np.frombuffer(f.read(row_num * row_size * dtype.itemsize), dtype=dtype).reshape(row_num, *shape[1:])
+    return head, shape[0]
+
+
+def get_summary_lines(results, max_num=10):
+    """
+    Yields the lines of a human-readable summary of analysis records.
+    ---
+    Parameters:
+    results (dict[str, dict[str, array-like of any]]): The record arrays by record name (see load_results)
+    max_num (int, optional): The maximum number of values shown per array
+    ---
+    Yields:
+    line (str): The summary line
+    """
+    for record_nm, arrs in results.items():
+        yield f"{record_nm}:"
+        for nm, arr in arrs.items():
+            yield f"    {nm}: {_format_arr(arr, max_num=max_num)}"
+        yield ""
+
+
+def write_summary(file_pth, summary_pth, max_num=10):
+    """
+    Writes a human-readable summary of a result file. The entries are read one after another and
+    only their first values, so that the summary needs little memory for large result files.
+    ---
+    Parameters:
+    file_pth (str): The result file path
+    summary_pth (str): The summary file path
+    max_num (int, optional): The maximum number of values shown per array
+    """
+    with zipfile.ZipFile(file_pth, mode="r") as zip_file, open(summary_pth, "w") as f:
+        last_record_nm = None
+        for entry_nm in zip_file.namelist():
+            record_nm, nm = entry_nm[:-len(".npy")].rsplit(SEP, 1)
+            if record_nm != last_record_nm:
+                if last_record_nm is not None:
+                    f.write("\n")
+                f.write(f"{record_nm}:\n")
+                last_record_nm = record_nm
+            with zip_file.open(entry_nm, mode="r") as entry_file:
+                head, length = _read_head(entry_file, max_num)
+            f.write(f"    {nm}: {_format_arr(head, max_num=max_num, length=length)}\n")
+        if last_record_nm is not None:
+            f.write("\n")
@@ -0,0 +1,219 @@
+"""
+ROOT file utility functions. Branches are read in bulk for all entries (or chunks of entries) of
+a tree and returned as flat arrays together with per-entry offsets. EDM calibration collections
+are read by a compiled helper.
+"""
+
+__all__ = ["EVT_BRANCH_NMS", "GENINFO_BRANCH_NMS", "read_tree", "iter_tree", "get_entry_num", "get_entry", "read_calib_hits"]
+
+import ctypes
+
+import numpy as np
+import ROOT as R
+
+
+EVT_BRANCH_NMS = ["hitTime", "pmtID", "PETrackID", "edep", "edepX", "edepY", "edepZ"]  # Branches of the DetSim user file "evt" tree
+GENINFO_BRANCH_NMS = ["InitX", "InitY", "InitZ", "InitPX", "InitPY", "InitPZ"]         # Branches of the DetSim user file "geninfo" tree
+
+
+def read_tree(file_pth, tree_nm, branch_nms, start=None, stop=None):
+    """
+    Reads branches of a tree for all entries (or an entry range). Only the given branches are read.
+    ---
+    Parameters:
+    file_pth (str): The ROOT file path
+    tree_nm (str): The tree name (e.g. evt, geninfo, TRec)
+    branch_nms (list[str]): The branch names
+    start (int, optional): The first entry to be read
+    stop (int, optional): The entry after the last entry to be read
+    ---
+    Returns:
+    arrs (dict[str, array-like]): The branch arrays (vector branches concatenated over all entries)
+    offsets (dict[str, array-like of int]): The entry offsets of vector branches (length entry number + 1)
+    ---
+    Example:
+    >>> arrs, offsets = read_tree("det_user.root", "evt", ["hitTime", "pmtID", "edepX"])
+    >>> hit_times_0 = arrs["hitTime"][offsets["hitTime"][0]:offsets["hitTime"][1]]
+    """
+    df = R.RDataFrame(tree_nm, file_pth)
+    if start is not None or stop is not None:
+        df = df.Range(start or 0, stop or 0)  # stop=0 reads up to the last entry
+    cols = df.AsNumpy(list(branch_nms))
+    arrs, offsets = {}, {}
+    for branch_nm in branch_nms:
+        col = cols[branch_nm]
+        if col.dtype != object:
+            arrs[branch_nm] = col
+            continue
+        ### Flatten vector branches
+        vecs = [np.asarray(vec) for vec in col]
+        lengths = np.fromiter((len(vec) for vec in vecs), dtype=np.int64, count=len(vecs))
+        offsets[branch_nm] = np.concatenate([[0], np.cumsum(lengths)])
+        arrs[branch_nm] = np.concatenate(vecs) if len(vecs) > 0 else np.asarray([])
+    return arrs, offsets
+
+
+def iter_tree(file_pth, tree_nm, branch_nms, chunk_size=1000):
+    """
+    Reads branches of a tree in chunks of entries (see read_tree), so that only one chunk is held
+    in memory.
+    ---
+    Parameters:
+    file_pth (str): The ROOT file path
+    tree_nm (str): The tree name (e.g. evt, geninfo, TRec)
+    branch_nms (list[str]): The branch names
+    chunk_size (int, optional): The number of entries per chunk
+    ---
+    Yields:
+    arrs (dict[str, array-like]): The branch arrays of the chunk (see read_tree)
+    offsets (dict[str, array-like of int]): The entry offsets of vector branches of the chunk (see read_tree)
+    ---
+    Example:
+    >>> for arrs, offsets in iter_tree("det_user.root", "evt", ["hitTime", "pmtID"]):
+    ...     for entry in range(get_entry_num(arrs, offsets)):
+    ...         vals = get_entry(arrs, offsets, entry)
+    """
+    file = R.TFile.Open(file_pth)
+    if not file or file.IsZombie():
+        raise OSError(f"Can't open {file_pth}")
+    tree = file.Get(tree_nm)
+    if not tree:
+        file.Close()
+        raise KeyError(f"Tree {tree_nm!r} not found in {file_pth}")
+    entry_num = tree.GetEntries()
+    file.Close()
+    for start in range(0, entry_num, chunk_size):
+        yield read_tree(file_pth, tree_nm, branch_nms, start=start, stop=min(start + chunk_size, entry_num))
+
+
+def get_entry_num(arrs, offsets):
+    """
+    Returns the number of entries of read branches.
+    ---
+    Parameters:
+    arrs (dict[str, array-like]): The branch arrays (see read_tree)
+    offsets (dict[str, array-like of int]): The entry offsets of vector branches (see read_tree)
+    ---
+    Returns:
+    entry_num (int): The number of entries
+    """
+    for branch_nm in arrs:
+        if branch_nm in offsets:
+            return len(offsets[branch_nm]) - 1
+        return len(arrs[branch_nm])
+    return 0
+
+
+def get_entry(arrs, offsets, entry):
+    """
+    Returns the branch values of one entry (vector branches as array views).
+    ---
+    Parameters:
+    arrs (dict[str, array-like]): The branch arrays (see read_tree)
+    offsets (dict[str, array-like of int]): The entry offsets of vector branches (see read_tree)
+    entry (int): The entry index
+    ---
+    Returns:
+    vals (dict[str, any]): The branch values
+    """
+    vals = {}
+    for branch_nm, arr in arrs.items():
+        if branch_nm in offsets:
+            vals[branch_nm] = arr[offsets[branch_nm][entry]:offsets[branch_nm][entry+1]]
+        else:
+            vals[branch_nm] = arr[entry]
+    return vals
+
+
+def _declare_calib_helpers():
+    """
+    Declares the C++ helper functions to read calibration collections in ROOT (once).
+    """
+    if hasattr(R, "FillCalibArrs"):
+        return
+    R.gInterpreter.Declare("""
+        #include <algorithm>
+        #include <cmath>
+        #include <type_traits>
+        template <typename V>
+        long long calibValNum(const V& vals) {
+            if constexpr (std::is_arithmetic_v<V>) return 1;
+            else return vals.size();
+        }
+        template <typename V>
+        void calibCopyVals(const V& vals, double* out) {
+            if constexpr (std::is_arithmetic_v<V>) out[0] = vals;
+            else { long long i = 0; for (auto val : vals) out[i++] = val; }
+        }
+        template <typename T>
+        void CalibSizes(T* calibEvt, long long* sizes) {
+            sizes[0] = 0;
+            sizes[1] = 0;
+            for (const auto* channel : calibEvt->calibPMTCol()) {
+                sizes[0] += 1;
+                sizes[1] += calibValNum(channel->time());
+            }
+        }
+        template <typename T>
+        void FillCalibArrs(T* calibEvt, unsigned int* pmtIds, double* firstHitTimes, long long* offsets, double* times, double* charges) {
+            long long i = 0;
+            offsets[0] = 0;
+            for (const auto* channel : calibEvt->calibPMTCol()) {
+                long long hitNum = calibValNum(channel->time());
+                pmtIds[i] = channel->pmtId();
+                firstHitTimes[i] = channel->firstHitTime();
+                calibCopyVals(channel->time(), times + offsets[i]);
+                if (calibValNum(channel->charge()) == hitNum) calibCopyVals(channel->charge(), charges + offsets[i]);
+                else std::fill(charges + offsets[i], charges + offsets[i] + hitNum, NAN);
+                offsets[i+1] = offsets[i] + hitNum;
+                ++i;
+            }
+        }
+    """)
+
+
+def _as_ptr(arr, c_type):
+    """
+    Returns a ctypes pointer to the data of an array.
+    """
+    return arr.ctypes.data_as(ctypes.POINTER(c_type))
+
+
+def read_calib_hits(calib_evt):
+    """
+    Reads all channels of a calibration event in C++ and fills preallocated arrays.
+    ---
+    Parameters:
+    calib_evt (CdLpmtCalibEvt or CdSpmtCalibEvt): The calibration event (e.g. tree.CdLpmtCalibEvt)
+    ---
+    Returns:
+    hits (dict[str, array-like]): The channel arrays
+        pmt_ids (uint32): The PMT identifiers (see id_utils.id2copyNo)
+        first_hit_times (float): The first hit times
+        offsets (int): The channel offsets into the hit arrays (length channel number + 1)
+    and the hit arrays
+        times (float): The hit times
+        charges (float): The hit charges (nan if not available per hit)
+        hit_pmt_ids (uint32): The PMT identifiers of the hits
+    """
+    _declare_calib_helpers()
+    sizes = np.zeros(2, dtype=np.int64)
+    R.CalibSizes(calib_evt, _as_ptr(sizes, ctypes.c_longlong))
+    channel_num, hit_num = sizes
+    hits = {
+        "pmt_ids":         np.zeros(channel_num, dtype=np.uint32),
+        "first_hit_times": np.zeros(channel_num, dtype=float),
+        "offsets":         np.zeros(channel_num + 1, dtype=np.int64),
+        "times":           np.zeros(hit_num, dtype=float),
+        "charges":         np.zeros(hit_num, dtype=float)
+    }
+    R.FillCalibArrs(
+        calib_evt,
+        _as_ptr(hits["pmt_ids"], ctypes.c_uint32),
+        _as_ptr(hits["first_hit_times"], ctypes.c_double),
+        _as_ptr(hits["offsets"], ctypes.c_longlong),
+        _as_ptr(hits["times"], ctypes.c_double),
+        _as_ptr(hits["charges"], ctypes.c_double)
+    )
+    hits["hit_pmt_ids"] = np.repeat(hits["pmt_ids"], np.diff(hits["offsets"]))
+    return hits
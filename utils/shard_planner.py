@@ -0,0 +1,158 @@
+"""
+Shard planner for detector simulation productions. A production (events per gun configuration
+of a particle/position/momentum grid) is split into jobs with collision-free, reproducible seeds
+and disjoint event id ranges. The plan is saved as a JSON manifest, from which each job can be
+run independently (locally or on HTCondor).
+"""
+
+__all__ = ["MAX_SEED", "draw_seeds", "plan_shards", "check_manifest", "save_manifest", "load_manifest", "get_job_cmd"]
+
+import os
+import json
+from itertools import product
+
+import numpy as np
+
+from .stages import detsim_cmd
+
+
+MAX_SEED = 2**31 - 1  # Seeds are drawn from [1, MAX_SEED]
+MANIFEST_VERSION = 2
+
+
+def draw_seeds(seed_num, base_seed=None):
+    """
+    Draws distinct seeds (without replacement), reproducible for a given base seed.
+    ---
+    Parameters:
+    seed_num (int): The number of seeds
+    base_seed (int, optional): The base seed of the generator (None for a random base seed)
+    ---
+    Returns:
+    seeds (list[int]): The seeds
+    """
+    rng = np.random.default_rng(base_seed)
+    seeds = rng.choice(MAX_SEED, size=seed_num, replace=False) + 1
+    return seeds.tolist()
+
+
+def plan_shards(evt_num, evts_per_job, particles, positions, momentums, base_seed=0, start_evtid=0):
+    """
+    Plans the jobs of a production. Every configuration of the grid gets evt_num events, split into
+    jobs of at most evts_per_job events. All jobs get distinct seeds and disjoint event id ranges.
+    ---
+    Parameters:
+    evt_num (int): The number of events per configuration
+    evts_per_job (int): The target number of events per job
+    particles (list[str]): The particle names (e.g. ["mu-"])
+    positions (list[list[str]]): The positions (x, y, z)
+    momentums (list[list[str]]): The momentums [MeV]
+    base_seed (int, optional): The base seed from which all job seeds are drawn
+    start_evtid (int, optional): The first event id of the production
+    ---
+    Returns:
+    manifest (dict): The production plan with the jobs
+    ---
+    Example:
+    >>> manifest = plan_shards(10000, 100, ["mu-"], [["0", "0", "0"]], [["1000"], ["2000"]], base_seed=42)
+    >>> len(manifest["jobs"])
+    200
+    """
+    assert evt_num > 0 and evts_per_job > 0
+    job_evt_nums = [evts_per_job] * (evt_num // evts_per_job)
+    if evt_num % evts_per_job:
+        job_evt_nums.append(evt_num % evts_per_job)
+    configs = list(product(particles, positions, momentums))
+    seeds = draw_seeds(len(configs) * len(job_evt_nums), base_seed)
+    jobs = []
+    evtid = start_evtid
+    for (particle, position, momentum) in configs:
+        for i, job_evt_num in enumerate(job_evt_nums, start=1):
+            jobs.append({
+                "job": len(jobs), "particles": particle, "position": list(position), "momentum": list(momentum), "i": i,
+                "seed": seeds[len(jobs)], "start_evtid": evtid, "evtmax": job_evt_num,
+            })
+            evtid += job_evt_num
+    manifest = {
+        "version": MANIFEST_VERSION, **_get_plan_pars(evt_num, evts_per_job, particles, positions, momentums, base_seed, start_evtid),
+        "jobs": jobs,
+    }
+    return manifest
+
+
+def _get_plan_pars(evt_num, evts_per_job, particles, positions, momentums, base_seed, start_evtid):
+    """
+    Returns the parameters of a plan as stored in the manifest (JSON types).
+    """
+    return {
+        "evt_num": evt_num, "evts_per_job": evts_per_job, "particles": list(particles),
+        "positions": [list(position) for position in positions], "momentums": [list(momentum) for momentum in momentums],
+        "base_seed": base_seed, "start_evtid": start_evtid,
+    }
+
+
+def check_manifest(manifest, evt_num, evts_per_job, particles, positions, momentums, base_seed=0, start_evtid=0):
+    """
+    Checks that a manifest was planned with the given parameters (see plan_shards).
+    ---
+    Parameters:
+    manifest (dict): The production plan
+    evt_num, evts_per_job, particles, positions, momentums, base_seed, start_evtid: The parameters (see plan_shards)
+    ---
+    Raises:
+    ValueError: If any parameter differs from the manifest
+    """
+    pars = _get_plan_pars(evt_num, evts_per_job, particles, positions, momentums, base_seed, start_evtid)
+    diffs = [f"{nm}: {manifest.get(nm)!r} (manifest) != {val!r}" for nm, val in pars.items() if manifest.get(nm) != val]
+    if diffs:
+        raise ValueError("The manifest was planned with other parameters:\n" + "\n".join(diffs))
+
+
+def save_manifest(manifest, file_pth):
+    """
+    Saves a manifest (written under a temporary name and moved into place).
+    ---
+    Parameters:
+    manifest (dict): The production plan (see plan_shards)
+    file_pth (str): The manifest file path
+    """
+    tmp_pth = f"{file_pth}.tmp{os.getpid()}"
+    with open(tmp_pth, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_pth, file_pth)
+
+
+def load_manifest(file_pth):
+    """
+    Loads a manifest.
+    ---
+    Parameters:
+    file_pth (str): The manifest file path
+    ---
+    Returns:
+    manifest (dict): The production plan (see plan_shards)
+    """
+    with open(file_pth, "r") as f:
+        manifest = json.load(f)
+    assert manifest.get("version") == MANIFEST_VERSION, f"Unsupported manifest version in {file_pth}"
+    return manifest
+
+
+def get_job_cmd(tutorialroot, output_dir, job):
+    """
+    Returns the detector simulation command of a job.
+    ---
+    Parameters:
+    tutorialroot (str): The TUTORIALROOT directory
+    output_dir (str): The output directory
+    job (dict): The job of a manifest
+    ---
+    Returns:
+    cmd (list[str]): The command
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    return detsim_cmd(
+        tutorialroot, output_dir, job["particles"], job["i"], job["momentum"], job["position"], job["seed"],
+        evtmax=str(job["evtmax"]), start_evtid=str(job["start_evtid"])
+    )
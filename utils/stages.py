@@ -0,0 +1,234 @@
+"""
+Simulation stage commands. Each function builds the JUNO tutorial command of one stage for
+one file together with its output paths, so that the stage scripts and the pipeline runner
+use the same commands and file names.
+"""
+
+__all__ = ["STAGE_DIR_NMS", "get_output_pths", "detsim_cmd", "det2elec_cmd", "elec2rec_cmd", "det2rec_cmd", "is_up_to_date", "run_stage"]
+
+import os
+
+from . import cache_utils as cu
+from .executor import run_cmd
+
+
+STAGE_DIR_NMS = {  # Output directory names of the stages (relative to the simulation directory)
+    "detsim": "detsim",
+    "det2elec": "det2elec",
+    "elec2rec": "elec2rec",
+    "det2rec": "det2rec",
+}
+STAMP_EXT = ".stamp"  # Extension of the stamp files next to the outputs (input size, modification time and command)
+STAGE_SUFFIXES = {  # Output file name suffixes of the stages (appended to the input base name)
+    "det2elec": "2elec",
+    "elec2rec": "2rec",
+    "det2rec": "2rec",
+}
+
+
+def get_output_pths(input_path, output_dir, stage_nm):
+    """
+    Returns the output paths of a stage for an input file.
+    ---
+    Parameters:
+    input_path (str): The input .root file path
+    output_dir (str): The output directory
+    stage_nm (str): The stage (det2elec, elec2rec, det2rec)
+    ---
+    Returns:
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(output_dir, f"{base}{STAGE_SUFFIXES[stage_nm]}{ext}")
+    user_output_path = os.path.join(output_dir, f"{base}{STAGE_SUFFIXES[stage_nm]}_user{ext}")
+    return output_path, user_output_path
+
+
+def detsim_cmd(tutorialroot, output_dir, particles, i, momentum, position, seed, evtmax="1", start_evtid="0"):
+    """
+    Returns the detector simulation command for one particle gun file.
+    ---
+    Parameters:
+    tutorialroot (str): The TUTORIALROOT directory
+    output_dir (str): The output directory
+    particles (str): The particle name (e.g. mu-)
+    i (int): The file number within the group
+    momentum (list[str]): The momentums [MeV]
+    position (list[str]): The position (x, y, z)
+    seed (int): The random seed
+    evtmax (str, optional): The number of events
+    start_evtid (str, optional): The first event id
+    ---
+    Returns:
+    cmd (list[str]): The command
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    base = f"{particles}_{i}_{momentum[0]}MeV_{evtmax}Evts_0to0R_{seed}seed_det"
+    output_path = os.path.join(output_dir, f"{base}.root")
+    user_output_path = os.path.join(output_dir, f"{base}_user.root")
+    cmd = [
+        "python", f"{tutorialroot}/share/tut_detsim.py",
+        "--evtmax", evtmax,
+        "--anamgr-normal-hit",
+        "--start-evtid", start_evtid,
+        "--seed", str(seed),
+        "--output", output_path,
+        "--user-output", user_output_path,
+        "--anamgr-edm",
+        "gun",
+        "--particles", particles,
+        "--positions", *position,
+        "--momentums", *momentum,
+    ]
+    return cmd, output_path, user_output_path
+
+
+def det2elec_cmd(tutorialroot, input_path, output_dir, evtmax="-1"):
+    """
+    Returns the electronics simulation command for one detector simulation file.
+    ---
+    Parameters:
+    tutorialroot (str): The TUTORIALROOT directory
+    input_path (str): The detector simulation .root file path
+    output_dir (str): The output directory
+    evtmax (str, optional): The number of events (-1 for all)
+    ---
+    Returns:
+    cmd (list[str]): The command
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    output_path, user_output_path = get_output_pths(input_path, output_dir, "det2elec")
+    cmd = [
+        "python", f"{tutorialroot}/share/tut_det2elec.py",
+        "--evtmax", evtmax,
+        "--input", input_path,
+        "--output", output_path,
+        "--user-output", user_output_path,
+        "--EnableUserOutput",
+        "--enableSaveTruths",
+        "--enableStoreElecTruthEDM"
+    ]
+    return cmd, output_path, user_output_path
+
+
+def elec2rec_cmd(tutorialroot, input_path, output_dir, evtmax="-1"):
+    """
+    Returns the reconstruction command for one electronics simulation file.
+    ---
+    Parameters:
+    tutorialroot (str): The TUTORIALROOT directory
+    input_path (str): The electronics simulation .root file path
+    output_dir (str): The output directory
+    evtmax (str, optional): The number of events (-1 for all)
+    ---
+    Returns:
+    cmd (list[str]): The command
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    output_path, user_output_path = get_output_pths(input_path, output_dir, "elec2rec")
+    cmd = [
+        "python", f"{tutorialroot}/share/tut_rtraw2rec.py",  #tut_rtraw2rec.py or tut_elec2rec.py: No such file or directory
+        "--evtmax", evtmax,
+        "--input", input_path,
+        #"--Algorithm omilrec",
+        #"--seed", str(seed),
+        "--output", output_path,
+        "--user-output", user_output_path,
+        "--EnableUserOutput",
+        "--method", "energy-point"
+    ]
+    return cmd, output_path, user_output_path
+
+
+def det2rec_cmd(tutorialroot, input_path, output_dir, evtmax="-1"):
+    """
+    Returns the electronics simulation and reconstruction command for one detector simulation file.
+    ---
+    Parameters:
+    tutorialroot (str): The TUTORIALROOT directory
+    input_path (str): The detector simulation .root file path
+    output_dir (str): The output directory
+    evtmax (str, optional): The number of events (-1 for all)
+    ---
+    Returns:
+    cmd (list[str]): The command
+    output_path (str): The output .root file path
+    user_output_path (str): The user output .root file path
+    """
+    output_path, user_output_path = get_output_pths(input_path, output_dir, "det2rec")
+    cmd = [
+        "python", f"{tutorialroot}/share/tut_elec2rec.py",  #tut_rtraw2rec.py or tut_elec2rec.py: No such file or directory
+        "--evtmax", evtmax,
+        "--input", input_path,
+        #"--seed", str(seed),
+        "--output", output_path,
+        "--user-output", user_output_path,
+        "--EnableUserOutput",
+        "--enableSaveTruths",
+        "--enableStoreElecTruthEDM"
+    ]
+    return cmd, output_path, user_output_path
+
+
+def _get_stamp(cmd, input_path):
+    """
+    Returns the stamp of a stage run from the input file (path, size, modification time) and the command.
+    """
+    return cu.get_key(input_path, cmd=list(cmd))
+
+
+def is_up_to_date(cmd, input_path, output_paths):
+    """
+    Checks whether the outputs of a stage were produced from the current input file with the same command.
+    ---
+    Parameters:
+    cmd (list[str]): The command
+    input_path (str): The input .root file path
+    output_paths (list[str]): The output .root file paths
+    ---
+    Returns:
+    is_up_to_date (bool): Whether the stage can be skipped
+    """
+    try:
+        stamp = _get_stamp(cmd, input_path)
+        for output_path in output_paths:
+            if not os.path.isfile(output_path):
+                return False
+            with open(f"{output_path}{STAMP_EXT}", "r") as f:
+                if f.read() != stamp:
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+def run_stage(cmd, input_path, output_paths, force=False, log_pth=None):
+    """
+    Runs a stage command unless its outputs are up to date, and stamps the outputs afterwards.
+    ---
+    Parameters:
+    cmd (list[str]): The command
+    input_path (str): The input .root file path
+    output_paths (list[str]): The output .root file paths
+    force (bool, optional): Runs the command even if the outputs are up to date
+    log_pth (str, optional): The log file path of the command output
+    ---
+    Returns:
+    is_run (bool): Whether the command was run (False if skipped)
+    """
+    if not force and is_up_to_date(cmd, input_path, output_paths):
+        return False
+    ### Remove old stamps first, so that an interrupted run is never taken as up to date
+    for output_path in output_paths:
+        if os.path.isfile(f"{output_path}{STAMP_EXT}"):
+            os.remove(f"{output_path}{STAMP_EXT}")
+    run_cmd(cmd, log_pth=log_pth)
+    stamp = _get_stamp(cmd, input_path)
+    for output_path in output_paths:
+        with open(f"{output_path}{STAMP_EXT}", "w") as f:
+            f.write(stamp)
+    return True